@@ -0,0 +1,129 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+
+A load generator for the dice servers.
+
+The server runs in a separate process.
+Many concurrent clients send requests as fast as they get responses.
+With the asyncio server, each client keeps one connection open, and frames its requests.
+With the original server, each request is a new connection.
+With ``--accept``, the asyncio clients negotiate compression, and decode the responses.
+"""
+import argparse
+import asyncio
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from dice_server import ACCEPT, ResponseDecoder, frame, read_frame  # noqa: E402
+
+SERVER = Path(__file__).parent.parent / "src" / "dice_server.py"
+REQUEST = b"Dice 6 4d6d1"
+
+
+async def framed_client(
+    host: str, port: int, requests: int, latencies: list[float], accept: bytes | None
+) -> int:
+    reader, writer = await asyncio.open_connection(host, port)
+    decode = ResponseDecoder()
+    if accept is not None:
+        writer.write(frame(ACCEPT + accept))
+        await read_frame(reader)
+    received = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        writer.write(frame(REQUEST))
+        await writer.drain()
+        if (response := await read_frame(reader)) is None:
+            raise ConnectionError("Server closed the connection")
+        if accept is not None:
+            decode(response)
+        latencies.append(time.perf_counter() - start)
+        received += len(response)
+    writer.close()
+    await writer.wait_closed()
+    return received
+
+
+async def connection_per_request_client(
+    host: str, port: int, requests: int, latencies: list[float], accept: bytes | None
+) -> int:
+    received = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(REQUEST)
+        await writer.drain()
+        received += len(await reader.read(1024))
+        writer.close()
+        await writer.wait_closed()
+        latencies.append(time.perf_counter() - start)
+    return received
+
+
+async def load(
+    host: str, port: int, clients: int, requests: int, server: str, accept: bytes | None
+) -> tuple[float, list[float], int]:
+    client = framed_client if server == "async" else connection_per_request_client
+    latencies: list[float] = []
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as group:
+        tasks = [
+            group.create_task(client(host, port, requests, latencies, accept))
+            for _ in range(clients)
+        ]
+    received = sum(task.result() for task in tasks)
+    return time.perf_counter() - start, latencies, received
+
+
+def run(
+    server: str, pipeline: str, port: int, clients: int, requests: int, accept: bytes | None
+) -> None:
+    command = [
+        sys.executable, str(SERVER),
+        "--server", server, "--pipeline", pipeline, "--port", str(port),
+    ]  # fmt: skip
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(0.5)
+        assert process.poll() is None, f"{command} didn't start"
+        elapsed, latencies, received = asyncio.run(
+            load("localhost", port, clients, requests, server, accept)
+        )
+    finally:
+        process.terminate()
+        process.wait()
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[-1]
+    print(
+        f"{server:5s} {pipeline:5s} {clients:5d} clients "
+        f"{len(latencies) / elapsed:10,.0f} requests/sec  "
+        f"p50 {1000 * p50:7.3f}ms  p99 {1000 * p99:7.3f}ms  "
+        f"{received / len(latencies):6.1f} bytes/response"
+    )
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--requests", type=int, default=20_000, help="total per run")
+    parser.add_argument("--pipeline", default="zip")
+    parser.add_argument("--port", type=int, default=2402)
+    parser.add_argument("--sync", action="store_true", help="include the original server")
+    parser.add_argument("--accept", type=str.encode, help='codecs to offer, like "deflate gzip"')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = get_options()
+    servers = ["async", "sync"] if options.sync else ["async"]
+    runs = [(server, clients) for server in servers for clients in options.clients]
+    # A fresh port for each run; the original server can't reuse one in TIME_WAIT.
+    for port, (server, clients) in enumerate(runs, start=options.port):
+        per_client = max(1, options.requests // clients)
+        run(server, options.pipeline, port, clients, per_client, options.accept)
@@ -0,0 +1,97 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+
+What does compressing the responses cost, and what does it save?
+
+The same dice responses go through each :class:`dice_server.ZipRoller` encoding,
+and through the original ``GzipFile`` for each response.
+The responses are rolled once, up front, so only the compression is timed;
+the cost of rolling them is shown for comparison.
+CPU time is process time, per response; bytes are what goes in the frame.
+"""
+import argparse
+from collections.abc import Iterator
+import gzip
+import io
+from pathlib import Path
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import dice  # noqa: E402
+from dice_server import Encoding, ResponseDecoder, ZipRoller  # noqa: E402
+
+ENCODINGS = [
+    Encoding("gzip", 9, 0),
+    Encoding("gzip", 6, 0),
+    Encoding("gzip", 1, 0),
+    Encoding("deflate", 9, 0),
+    Encoding("deflate", 6, 0),
+    Encoding("deflate", 1, 0),
+    Encoding("gzip", 1, 64),
+    Encoding("deflate", 1, 64),
+    Encoding("identity", 0, 0),
+]
+
+
+def original(response: bytes) -> bytes:
+    """What ZipRoller used to do for every response."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="w") as zipfile:
+        zipfile.write(response)
+    return buffer.getvalue()
+
+
+def report(name: str, seconds: float, responses: list[bytes], sent: int) -> None:
+    raw = sum(len(r) for r in responses)
+    print(
+        f"{name:24s} {1e6 * seconds / len(responses):8.2f}us/response  "
+        f"{sent / len(responses):8.1f} bytes/response  {sent / raw:6.1%} of raw"
+    )
+
+
+def main(requests: list[bytes], count: int) -> None:
+    random.seed(42)
+    workload = [random.choice(requests) for _ in range(count)]
+    start = time.process_time()
+    responses = [dice.dice_roller(request) for request in workload]
+    report("roll (no compression)", time.process_time() - start, responses, sum(map(len, responses)))
+
+    start = time.process_time()
+    sent = sum(len(original(response)) for response in responses)
+    report("original GzipFile", time.process_time() - start, responses, sent)
+
+    for encoding in ENCODINGS:
+        queued = iter(responses)
+
+        def replay(request: bytes, queued: Iterator[bytes] = queued) -> bytes:
+            return next(queued)
+
+        roller = ZipRoller(replay, *encoding)
+        start = time.process_time()
+        frames = [roller(request) for request in workload]
+        seconds = time.process_time() - start
+        decode = ResponseDecoder()
+        assert [decode(f) for f in frames] == responses
+        name = f"{encoding.codec} {encoding.level} >={encoding.threshold}"
+        report(name, seconds, responses, sum(map(len, frames)))
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--request",
+        type=str.encode,
+        nargs="+",
+        default=[b"Dice 1 d6", b"Dice 6 4d6d1", b"Dice 20 3d6+2", b"Dice 200 d20"],
+    )
+    parser.add_argument("--count", type=int, default=20_000)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = get_options()
+    main(options.request, options.count)
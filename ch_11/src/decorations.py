@@ -95,11 +95,12 @@ class NamedLogger:
             try:
                 result = function(*args, **kwargs)
                 μs = (time.perf_counter() - start) * 1_000_000
-                self.logger.info(f"{function.__name__}, {μs:.1f}μs")
+                # The message is only formatted if the logger is enabled for it.
+                self.logger.info("%s, %.1fμs", function.__name__, μs)
                 return result
             except Exception as ex:
                 μs = (time.perf_counter() - start) * 1_000_000
-                self.logger.error(f"{ex}, {function.__name__}, {μs:.1f}μs")
+                self.logger.error("%s, %s, %.1fμs", ex, function.__name__, μs)
                 raise
 
         return wrapped_function
@@ -126,6 +127,257 @@ def test4(median: float, sample: float) -> float:
     return abs(sample - median)
 
 
+from collections.abc import Iterator
+
+from latency import LatencyHistogram
+
+
+class Profiler:
+    """
+    A decorator that puts each call's time into a :class:`latency.LatencyHistogram`
+    for the function, instead of logging it.
+
+    Turning off :attr:`enabled` turns off the timing for every decorated function,
+    without decorating them again.
+    Every ``report_seconds``, the next call that finishes logs
+    the p50, p95, and p99 times of every function, at INFO level.
+    """
+
+    def __init__(self, logger_name: str = "profile", report_seconds: float = 60.0) -> None:
+        self.logger = logging.getLogger(logger_name)
+        self.enabled = True
+        self.report_seconds = report_seconds
+        self.next_report = time.perf_counter() + report_seconds
+        self.histograms: dict[str, LatencyHistogram] = {}
+
+    def __call__(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        histogram = self.histograms.setdefault(function.__qualname__, LatencyHistogram())
+
+        @wraps(function)
+        def wrapped_function(*args: Any, **kwargs: Any) -> Any:
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                histogram.record(end - start)
+                if end >= self.next_report:
+                    self.report()
+
+        return wrapped_function
+
+    def summaries(self) -> Iterator[str]:
+        for name, histogram in self.histograms.items():
+            if histogram.count:
+                yield f"{name}: {histogram.summary()}"
+
+    def report(self) -> None:
+        self.next_report = time.perf_counter() + self.report_seconds
+        if self.logger.isEnabledFor(logging.INFO):
+            for summary in self.summaries():
+                self.logger.info("%s", summary)
+
+
+test_profiler = """
+>>> profile = Profiler()
+>>> @profile
+... def test5(a: int, b: int) -> int:
+...     return a + b
+>>> [test5(i, 1) for i in range(3)]
+[1, 2, 3]
+>>> profile.enabled = False
+>>> test5(3, 1)
+4
+>>> list(profile.summaries())
+['test5: count 3  mean ...us  p50 ...us  p95 ...us  p99 ...us  max ...us']
+"""
+
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from functools import update_wrapper
+from types import MethodType
+from typing import NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expired: int
+    size: int
+    maxsize: int | None
+
+
+def make_key(*args: Any, **kwargs: Any) -> Hashable:
+    """The default key: the arguments themselves, which must be hashable."""
+    if kwargs:
+        return args, tuple(sorted(kwargs.items()))
+    return args
+
+
+class Memoized:
+    """
+    A function with a cache of its results; see :func:`memoize`.
+
+    The lock only protects the cache, it isn't held while the function runs:
+    two threads that miss on the same key at the same time will both call the function.
+    """
+
+    def __init__(
+        self,
+        function: Callable[..., Any],
+        maxsize: int | None,
+        ttl: float | None,
+        key: Callable[..., Hashable],
+        clock: Callable[[], float],
+    ) -> None:
+        update_wrapper(self, function)
+        self.function = function
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key = key
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Least recently used first; each value is (expiry time, result).
+        self.cache: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        if self.key is make_key and not kwargs:
+            key: Hashable = args
+        else:
+            key = self.key(*args, **kwargs)
+        ttl = self.ttl
+        now = self.clock() if ttl is not None else 0.0
+        cache = self.cache
+        with self.lock:
+            if (entry := cache.get(key)) is not None:
+                if ttl is None or now < entry[0]:
+                    cache.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del cache[key]
+                self.expired += 1
+            self.misses += 1
+        result = self.function(*args, **kwargs)
+        expires = now + self.ttl if self.ttl is not None else 0.0
+        with self.lock:
+            self.cache[key] = (expires, result)
+            self.cache.move_to_end(key)
+            while self.maxsize is not None and len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def __get__(self, instance: Any, owner: type | None = None) -> Any:
+        """As a method: bound to the instance, which becomes part of the key."""
+        if instance is None:
+            return self
+        return MethodType(self, instance)
+
+    def cache_info(self) -> CacheInfo:
+        with self.lock:
+            return CacheInfo(
+                self.hits, self.misses, self.evictions, self.expired, len(self.cache), self.maxsize
+            )
+
+    def cache_clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
+            self.hits = self.misses = self.evictions = self.expired = 0
+
+
+def memoize(
+    maxsize: int | None = 128,
+    ttl: float | None = None,
+    key: Callable[..., Hashable] = make_key,
+    clock: Callable[[], float] = time.monotonic,
+) -> Callable[[Callable[..., Any]], Memoized]:
+    """
+    Cache a function's results.
+
+    At most ``maxsize`` results are kept, dropping the least recently used;
+    ``None`` means no limit. A result more than ``ttl`` seconds old is computed again.
+    The ``key`` function is called with the same arguments as the decorated function,
+    and returns a hashable key for them; use it when the arguments aren't hashable.
+    The counts are available from ``cache_info()``, like :func:`functools.lru_cache`.
+    """
+
+    def decorator(function: Callable[..., Any]) -> Memoized:
+        return Memoized(function, maxsize, ttl, key, clock)
+
+    return decorator
+
+
+test_memoize = """
+>>> cached_test1 = memoize(maxsize=2)(log_args(test1))
+>>> cached_test1(1, 9, 2)
+Calling test1(*(1, 9, 2), **{})
+22.5
+>>> cached_test1(1, 9, 2)
+22.5
+>>> cached_test1(1, 2, 3), cached_test1(1, 3, 3)
+Calling test1(*(1, 2, 3), **{})
+Calling test1(*(1, 3, 3), **{})
+(1.0, 2.0)
+>>> cached_test1.cache_info()
+CacheInfo(hits=1, misses=3, evictions=1, expired=0, size=2, maxsize=2)
+
+>>> timed_test3 = log_time(memoize()(test3))
+>>> timed_test3(2, 10)
+Executed test3 in ...μs
+1024
+"""
+
+test_memoize_ttl_key = """
+>>> from unittest.mock import Mock
+>>> clock = Mock(return_value=0.0)
+>>> @memoize(ttl=10, key=lambda hand: tuple(sorted(hand)), clock=clock)
+... def pairs(hand: list[int]) -> int:
+...     return sum(hand.count(v) == 2 for v in set(hand))
+>>> pairs([2, 2, 4, 4, 5, 5]), pairs([5, 4, 2, 5, 4, 2])
+(3, 3)
+>>> clock.return_value = 10.0
+>>> pairs([2, 2, 4, 4, 5, 5])
+3
+>>> pairs.cache_info()
+CacheInfo(hits=1, misses=2, evictions=0, expired=1, size=1, maxsize=128)
+"""
+
+test_memoize_method = """
+>>> class Hand:
+...     def __init__(self, dice: tuple[int, ...]) -> None:
+...         self.dice = dice
+...     @memoize()
+...     def total(self, bonus: int) -> int:
+...         return sum(self.dice) + bonus
+>>> hand = Hand((1, 2, 3))
+>>> hand.total(1), hand.total(1), Hand((6, 6)).total(1)
+(7, 7, 13)
+>>> hand.total.cache_info()
+CacheInfo(hits=1, misses=2, evictions=0, expired=0, size=2, maxsize=128)
+"""
+
+test_memoize_threads = """
+>>> from concurrent.futures import ThreadPoolExecutor
+>>> square = memoize(maxsize=50)(lambda x: x * x)
+>>> with ThreadPoolExecutor(8) as pool:
+...     results = list(pool.map(square, [i % 100 for i in range(10_000)]))
+>>> results[:5], results[-1]
+([0, 1, 4, 9, 16], 9801)
+>>> info = square.cache_info()
+>>> info.hits + info.misses, info.size
+(10000, 50)
+"""
+
+
 __test__ = {name: case for name, case in globals().items() if name.startswith("test_")}
 
 if __name__ == "__main__":
@@ -145,6 +397,13 @@ if __name__ == "__main__":
     test2(4, b=5)
     test3(6, 7)
 
+    profile = Profiler(report_seconds=0.5)
+    logging.basicConfig(level=logging.INFO)
+    test1 = profile(test1)
+    deadline = time.perf_counter() + 1.0
+    while time.perf_counter() < deadline:
+        test1(1, 2, 3)
+
     test4 = NamedLogger("log4")(test4)
     test4(12, 14)
     test4("hello", "world")  # pyright: ignore
@@ -6,6 +6,94 @@ Chapter 11. Common Design Patterns
 import abc
 import random
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+
+class Batch(abc.ABC):
+    """
+    Many rolls of the same dice at once: one row of dice per roll.
+    The rows are sorted, like :class:`Roll` sorts the dice,
+    so dropping and keeping work the same way.
+    """
+
+    def __init__(self, count: int, seed: int | None) -> None:
+        self.count = count
+        self.modifier = 0
+
+    @abc.abstractmethod
+    def roll(self, n: int, d: int) -> None:
+        ...
+
+    @abc.abstractmethod
+    def drop(self, amount: int) -> None:
+        ...
+
+    @abc.abstractmethod
+    def keep(self, amount: int) -> None:
+        ...
+
+    @abc.abstractmethod
+    def totals(self) -> list[int]:
+        ...
+
+
+class ListBatch(Batch):
+    """Lists of dice, rolled with a :class:`random.Random` for each batch."""
+
+    def __init__(self, count: int, seed: int | None) -> None:
+        super().__init__(count, seed)
+        self.rng = random.Random(seed)
+        self.rows: list[list[int]] = []
+
+    def roll(self, n: int, d: int) -> None:
+        randint = self.rng.randint
+        self.rows = [
+            sorted(randint(1, d) for _ in range(n)) for _ in range(self.count)
+        ]
+        self.modifier = 0
+
+    def drop(self, amount: int) -> None:
+        self.rows = [row[amount:] for row in self.rows]
+
+    def keep(self, amount: int) -> None:
+        self.rows = [row[:amount] for row in self.rows]
+
+    def totals(self) -> list[int]:
+        return [sum(row) + self.modifier for row in self.rows]
+
+
+class ArrayBatch(Batch):
+    """A (count x n) NumPy array of dice, drawn with one call to a :class:`numpy.random.Generator`."""
+
+    def __init__(self, count: int, seed: int | None) -> None:
+        super().__init__(count, seed)
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.zeros((count, 0), dtype=np.int64)
+
+    def roll(self, n: int, d: int) -> None:
+        self.rows = np.sort(self.rng.integers(1, d, size=(self.count, n), endpoint=True), axis=1)
+        self.modifier = 0
+
+    def drop(self, amount: int) -> None:
+        self.rows = self.rows[:, amount:]
+
+    def keep(self, amount: int) -> None:
+        self.rows = self.rows[:, :amount]
+
+    def totals(self) -> list[int]:
+        totals: list[int] = (self.rows.sum(axis=1) + self.modifier).tolist()
+        return totals
+
+
+def new_batch(count: int, seed: int | None = None) -> Batch:
+    """An :class:`ArrayBatch` if NumPy is installed, otherwise a :class:`ListBatch`."""
+    if np is None:
+        return ListBatch(count, seed)  # pragma: no cover
+    return ArrayBatch(count, seed)
+
 
 class Adjustment(abc.ABC):
     def __init__(self, amount: int) -> None:
@@ -15,6 +103,10 @@ class Adjustment(abc.ABC):
     def apply(self, dice: "Dice") -> None:
         ...
 
+    @abc.abstractmethod
+    def apply_many(self, batch: Batch) -> None:
+        ...
+
 
 class Roll(Adjustment):
     def __init__(self, n: int, d: int) -> None:
@@ -25,28 +117,84 @@ class Roll(Adjustment):
         dice.dice = sorted(random.randint(1, self.d) for _ in range(self.n))
         dice.modifier = 0
 
+    def apply_many(self, batch: Batch) -> None:
+        batch.roll(self.n, self.d)
+
 
 class Drop(Adjustment):
     def apply(self, dice: "Dice") -> None:
         dice.dice = dice.dice[self.amount :]
 
+    def apply_many(self, batch: Batch) -> None:
+        batch.drop(self.amount)
+
 
 class Keep(Adjustment):
     def apply(self, dice: "Dice") -> None:
         dice.dice = dice.dice[: self.amount]
 
+    def apply_many(self, batch: Batch) -> None:
+        batch.keep(self.amount)
+
 
 class Plus(Adjustment):
     def apply(self, dice: "Dice") -> None:
         dice.modifier += self.amount
 
+    def apply_many(self, batch: Batch) -> None:
+        batch.modifier += self.amount
+
 
 class Minus(Adjustment):
     def apply(self, dice: "Dice") -> None:
         dice.modifier -= self.amount
 
+    def apply_many(self, batch: Batch) -> None:
+        batch.modifier -= self.amount
 
+
+from functools import lru_cache
 import re
+from typing import NamedTuple
+
+DICE_PATTERN = re.compile(r"(?P<n>\d*)d(?P<d>\d+)(?P<a>(?:[dk+-]\d+)*)")
+ADJUSTMENT_PATTERN = re.compile(r"([dk+-])(\d+)")
+ADJ_CLASS: dict[str, type[Adjustment]] = {
+    "d": Drop,
+    "k": Keep,
+    "+": Plus,
+    "-": Minus,
+}
+
+
+class RollPlan(NamedTuple):
+    """The parsed form of a dice expression like ``"4d6k3+2"``."""
+
+    n: int
+    d: int
+    adjustments: tuple[tuple[type[Adjustment], int], ...]
+
+
+@lru_cache(maxsize=1024)
+def compile_dice(dice_text: str) -> RollPlan:
+    """
+    Parse a dice expression. Popular expressions are parsed once, and then come from the cache;
+    ``compile_dice.cache_info()`` has the hit and miss counts.
+
+    >>> compile_dice("4d6k3+2")
+    RollPlan(n=4, d=6, adjustments=((<class 'dice.Keep'>, 3), (<class 'dice.Plus'>, 2)))
+    """
+    if (dice_match := DICE_PATTERN.match(dice_text)) is None:
+        raise ValueError(f"Error in {dice_text!r}")
+
+    n = int(dice_match.group("n")) if dice_match.group("n") else 1
+    d = int(dice_match.group("d"))
+    adjustment_matches = ADJUSTMENT_PATTERN.finditer(dice_match.group("a") or "")
+    adjustments = tuple(
+        (ADJ_CLASS[a.group(1)], int(a.group(2))) for a in adjustment_matches
+    )
+    return RollPlan(n, d, adjustments)
+
 
 class Dice:
     def __init__(self, n: int, d: int, *adj: Adjustment) -> None:
@@ -59,27 +207,26 @@ class Dice:
             a.apply(self)
         return sum(self.dice) + self.modifier
 
+    def roll_many(self, count: int, seed: int | None = None) -> list[int]:
+        """
+        The totals of ``count`` rolls, computed as a batch.
+        The same seed gives the same totals, for the same batch implementation.
+        The distribution is the same as :meth:`roll`, but not the sequence of values.
+        """
+        batch = new_batch(count, seed)
+        for a in self.adjustments:
+            a.apply_many(batch)
+        return batch.totals()
+
     @classmethod
     def from_text(cls, dice_text: str) -> "Dice":
-        dice_pattern = re.compile(r"(?P<n>\d*)d(?P<d>\d+)(?P<a>(?:[dk+-]\d+)*)")
-        adjustment_pattern = re.compile(r"([dk+-])(\d+)")
-        adj_class: dict[str, type[Adjustment]] = {
-            "d": Drop,
-            "k": Keep,
-            "+": Plus,
-            "-": Minus,
-        }
-
-        if (dice_match := dice_pattern.match(dice_text)) is None:
-            raise ValueError(f"Error in {dice_text!r}")
-
-        n = int(dice_match.group("n")) if dice_match.group("n") else 1
-        d = int(dice_match.group("d"))
-        adjustment_matches = adjustment_pattern.finditer(dice_match.group("a") or "")
-        adjustments = [
-            adj_class[a.group(1)](int(a.group(2))) for a in adjustment_matches
-        ]
-        return cls(n, d, *adjustments)
+        plan = compile_dice(dice_text)
+        return cls.from_plan(plan)
+
+    @classmethod
+    def from_plan(cls, plan: RollPlan) -> "Dice":
+        adjustments = [adj_class(amount) for adj_class, amount in plan.adjustments]
+        return cls(plan.n, plan.d, *adjustments)
 
 
 D4 = 4
@@ -107,21 +254,35 @@ class Dice2:
         self.dice = [random.randint(1, self.d) for _ in range(self.n)]
         return sum(self.dice)
 
+    def roll_many(self, count: int, seed: int | None = None) -> list[int]:
+        batch = new_batch(count, seed)
+        batch.roll(self.n, self.d)
+        return batch.totals()
+
 
 # Instead of an abstract class, rely on duck typing...
 type DiceRoller = Dice2 | Dice
 implementations: dict[str, type[DiceRoller]] = {"Dice2": Dice2, "Dice": Dice}
 
 
+REQUEST_PATTERN = re.compile(r"(\w+) (\d+) (.*)")
+
+# At this many rolls, rolling them as a batch is faster.
+BULK_ROLLS = 100
+
+
 def dice_roller(request: bytes) -> bytes:
     request_text = request.decode("utf-8")
-    request_pattern = re.compile(r"(\w+) (\d+) (.*)")
-    if (request_match := request_pattern.match(request_text)) is None:
+    if (request_match := REQUEST_PATTERN.match(request_text)) is None:
         raise ValueError(f"Error in {request!r}")
     model_class = implementations[request_match.group(1)]
     count = int(request_match.group(2))
     dice = model_class.from_text(request_match.group(3))
-    numbers = [dice.roll() for _ in range(count)]
+    if count < BULK_ROLLS:
+        numbers = [dice.roll() for _ in range(count)]
+    else:
+        # Seeded from random, so random.seed() still makes the results repeatable.
+        numbers = dice.roll_many(count, seed=random.getrandbits(64))
     response = f"{request_text} = {numbers}"
     return response.encode("utf-8")
 
@@ -0,0 +1,172 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+
+The exact odds of a dice expression, without rolling any dice.
+
+:class:`dice.Roll` sorts the dice, and each :class:`dice.Drop` or :class:`dice.Keep`
+slices the sorted list, so what's left is always a window of the sorted dice:
+the dice from position ``lo`` up to, but not including, position ``hi``.
+:class:`dice.Plus` and :class:`dice.Minus` shift the total.
+
+With no dice dropped, the distribution of the sum is a convolution of one die with itself.
+Otherwise, it's built up one face value at a time, counting how many of the sorted positions
+each face fills, and how many of those are in the window.
+Either way, the results are counts of equally likely outcomes, kept exact as integers,
+and remembered for each ``(n, d, lo, hi)``.
+"""
+from collections.abc import Iterable, Iterator
+from fractions import Fraction
+from functools import lru_cache
+from math import comb
+from typing import NamedTuple
+
+from dice import Adjustment, Dice, Dice2, DiceRoller, Drop, Keep, Minus, Plus, Roll, RollPlan
+from dice import compile_dice
+
+
+class Shape(NamedTuple):
+    """``n`` dice with ``d`` faces, a window of the sorted dice, and a modifier."""
+
+    n: int
+    d: int
+    lo: int
+    hi: int
+    modifier: int
+
+    @classmethod
+    def from_adjustments(cls, adjustments: Iterable[Adjustment]) -> "Shape":
+        """
+        >>> Shape.from_adjustments(Dice.from_text("5d6d1k3+2").adjustments)
+        Shape(n=5, d=6, lo=1, hi=4, modifier=2)
+        """
+        n = d = lo = hi = modifier = 0
+        for a in adjustments:
+            if isinstance(a, Roll):
+                n, d, lo, hi, modifier = a.n, a.d, 0, a.n, 0
+            elif isinstance(a, Drop):
+                lo = min(lo + a.amount, hi)
+            elif isinstance(a, Keep):
+                hi = min(lo + a.amount, hi)
+            elif isinstance(a, Plus):
+                modifier += a.amount
+            elif isinstance(a, Minus):
+                modifier -= a.amount
+            else:
+                raise TypeError(f"No odds for {a!r}")
+        return cls(n, d, lo, hi, modifier)
+
+
+@lru_cache(maxsize=256)
+def sum_counts(n: int, d: int) -> tuple[int, ...]:
+    """
+    The number of ways ``n`` dice with ``d`` faces can add up to each total, from 0 to ``n * d``.
+    Each die adds a convolution with ``d`` ones, done with a running sum.
+
+    >>> sum_counts(2, 3)
+    (0, 0, 1, 2, 3, 2, 1)
+    """
+    ways = [1] + [0] * (n * d)
+    for rolled in range(n):
+        running = 0
+        next_ways = [0] * len(ways)
+        for total in range(1, (rolled + 1) * d + 1):
+            running += ways[total - 1]
+            if total > d:
+                running -= ways[total - d - 1]
+            next_ways[total] = running
+        ways = next_ways
+    return tuple(ways)
+
+
+@lru_cache(maxsize=256)
+def window_counts(n: int, d: int, lo: int, hi: int) -> tuple[int, ...]:
+    """
+    The number of ways the sorted dice in positions ``lo`` to ``hi`` can add up to each total.
+
+    Face values are placed in ascending order. When ``k`` dice show face ``v``,
+    they fill the next ``k`` sorted positions, and there are ``comb(remaining, k)``
+    ways to pick which of the remaining dice they are.
+    The window gets ``v`` for each of those positions inside it.
+
+    >>> window_counts(2, 3, 1, 2)  # The higher of 2d3
+    (0, 1, 3, 5)
+    """
+    if lo == 0 and hi == n:
+        return sum_counts(n, d)
+    # placed[p] maps a partial window total to its number of ways, with p positions filled.
+    placed: list[dict[int, int]] = [{0: 1}] + [{} for _ in range(n)]
+    for v in range(1, d + 1):
+        next_placed: list[dict[int, int]] = [{} for _ in range(n + 1)]
+        for p, totals in enumerate(placed):
+            if not totals:
+                continue
+            # The last face fills every remaining position.
+            counts = [n - p] if v == d else range(n - p + 1)
+            for k in counts:
+                inside = max(0, min(p + k, hi) - max(p, lo))
+                choices = comb(n - p, k)
+                target = next_placed[p + k]
+                for total, ways in totals.items():
+                    key = total + v * inside
+                    target[key] = target.get(key, 0) + ways * choices
+        placed = next_placed
+    finished = placed[n]
+    window = [0] * (max(finished) + 1)
+    for total, count in finished.items():
+        window[total] = count
+    return tuple(window)
+
+
+class Distribution:
+    """
+    The exact distribution of a dice expression's totals.
+
+    >>> odds = Distribution.from_text("4d6k3+2")
+    >>> odds.mean
+    Fraction(13939, 1296)
+    >>> odds.probability(5)
+    Fraction(7, 432)
+    >>> odds.at_least(10)
+    Fraction(209, 324)
+    """
+
+    def __init__(self, shape: Shape) -> None:
+        self.shape = shape
+        self.outcomes = shape.d**shape.n
+        self.ways = window_counts(shape.n, shape.d, shape.lo, shape.hi)
+
+    def __iter__(self) -> Iterator[tuple[int, Fraction]]:
+        """Each possible total, in ascending order, with its probability."""
+        for total, ways in enumerate(self.ways):
+            if ways:
+                yield total + self.shape.modifier, Fraction(ways, self.outcomes)
+
+    def probability(self, total: int) -> Fraction:
+        index = total - self.shape.modifier
+        if not 0 <= index < len(self.ways):
+            return Fraction(0)
+        return Fraction(self.ways[index], self.outcomes)
+
+    def at_least(self, total: int) -> Fraction:
+        index = max(0, total - self.shape.modifier)
+        return Fraction(sum(self.ways[index:]), self.outcomes)
+
+    @property
+    def mean(self) -> Fraction:
+        return sum((p * total for total, p in self), Fraction(0))
+
+    @classmethod
+    def from_text(cls, dice_text: str) -> "Distribution":
+        return cls.from_plan(compile_dice(dice_text))
+
+    @classmethod
+    def from_plan(cls, plan: RollPlan) -> "Distribution":
+        return cls.from_dice(Dice.from_plan(plan))
+
+    @classmethod
+    def from_dice(cls, dice: DiceRoller) -> "Distribution":
+        if isinstance(dice, Dice2):
+            return cls(Shape(dice.n, dice.d, 0, dice.n, 0))
+        return cls(Shape.from_adjustments(dice.adjustments))
@@ -6,22 +6,83 @@ Chapter 11. Common Design Patterns
 import contextlib
 import dice
 import gzip
-import io
 import socket
+import zlib
 from collections.abc import Callable
 
+# The codecs in order of the server's preference.
+CODECS = ("deflate", "gzip", "identity")
+GZIP_MAGIC = b"\x1f\x8b"
+# Marks a piece of a connection's deflate stream; a dice response never starts with NUL.
+DEFLATE_MARK = b"\x00"
+
 
 class ZipRoller:
-    def __init__(self, dice: Callable[[bytes], bytes]) -> None:
+    """
+    Compress the responses.
+
+    With ``"gzip"``, each response is a complete gzip file, starting with :data:`GZIP_MAGIC`.
+    With ``"deflate"``, the responses are pieces of one compressed stream,
+    each flushed so it can be decompressed as soon as it arrives.
+    The compressor lasts as long as this roller, usually one connection,
+    and later responses refer back to earlier ones.
+    Responses shorter than ``threshold`` bytes, or all of them with ``"identity"``,
+    are sent as they are.
+    """
+
+    def __init__(
+        self,
+        dice: Callable[[bytes], bytes],
+        codec: str = "gzip",
+        level: int = 9,
+        threshold: int = 0,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}")
         self.dice_roller = dice
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+        self.stream = (
+            zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if codec == "deflate"
+            else None
+        )
 
     def __call__(self, request: bytes) -> bytes:
         dice_roller = self.dice_roller
         response = dice_roller(request)
-        buffer = io.BytesIO()
-        with gzip.GzipFile(fileobj=buffer, mode="w") as zipfile:
-            zipfile.write(response)
-        return buffer.getvalue()
+        if self.codec == "identity" or len(response) < self.threshold:
+            return response
+        if self.stream is not None:
+            return (
+                DEFLATE_MARK
+                + self.stream.compress(response)
+                + self.stream.flush(zlib.Z_SYNC_FLUSH)
+            )
+        return gzip.compress(response, self.level, mtime=0)
+
+
+class ResponseDecoder:
+    """
+    The client side of :class:`ZipRoller`: one for each connection.
+    The first bytes of each response show how it was compressed.
+
+    >>> roller = ZipRoller(lambda request: request * 8, "deflate", threshold=16)
+    >>> decode = ResponseDecoder()
+    >>> [decode(roller(request)) for request in [b"a", b"bc", b"a"]]
+    [b'aaaaaaaa', b'bcbcbcbcbcbcbcbc', b'aaaaaaaa']
+    """
+
+    def __init__(self) -> None:
+        self.stream = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def __call__(self, payload: bytes) -> bytes:
+        if payload.startswith(GZIP_MAGIC):
+            return gzip.decompress(payload)
+        if payload.startswith(DEFLATE_MARK):
+            return self.stream.decompress(payload[1:])
+        return payload
 
 
 type Address = tuple[str, int]
@@ -56,9 +117,9 @@ import contextlib
 import socket
 
 
-def main_3() -> None:
+def main_3(port: int = 2401) -> None:
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(("localhost", 2401))
+    server.bind(("localhost", port))
     server.listen(1)
     with contextlib.closing(server):
         while True:
@@ -67,5 +128,394 @@ def main_3() -> None:
             client.close()
 
 
+import argparse
+import asyncio
+import struct
+import sys
+from typing import NamedTuple
+
+
+# Each request and response is a 4-byte big-endian length, then that many bytes.
+FRAME_HEADER = struct.Struct(">L")
+MAX_REQUEST = 64 * 1024
+MAX_RESPONSE = 1024 * 1024
+
+# A client's optional first request, for example b"Accept deflate gzip".
+ACCEPT = b"Accept "
+
+
+class Encoding(NamedTuple):
+    """How a connection's responses are compressed; see :class:`ZipRoller`."""
+
+    codec: str = "gzip"
+    level: int = 9
+    threshold: int = 0
+
+
+# A client that doesn't send an Accept request expects every response gzipped.
+LEGACY = Encoding()
+
+type Roller = Callable[[bytes], bytes]
+type Pipeline = Callable[[Address, Encoding], Roller]
+
+
+def plain_pipeline(remote_addr: Address, encoding: Encoding) -> Roller:
+    return dice.dice_roller
+
+
+def zip_pipeline(remote_addr: Address, encoding: Encoding) -> Roller:
+    return ZipRoller(dice.dice_roller, *encoding)
+
+
+def logged_zip_pipeline(remote_addr: Address, encoding: Encoding) -> Roller:
+    """The same decorators as :func:`dice_response`."""
+    return LogRoller(ZipRoller(dice.dice_roller, *encoding), remote_addr=remote_addr)
+
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import TextIO
+
+from latency import LatencyHistogram
+
+
+class RequestRecord(NamedTuple):
+    remote_addr: Address
+    request: bytes
+    response: bytes | None
+    error: Exception | None
+    seconds: float
+
+
+def endpoint(request: bytes) -> str:
+    """
+    The dice implementation a request asks for; anything else is ``"other"``.
+
+    >>> endpoint(b"Dice2 6 2d6"), endpoint(b"Nonsense")
+    ('Dice2', 'other')
+    """
+    name = request.partition(b" ")[0].decode("utf-8", "replace")
+    return name if name in dice.implementations else "other"
+
+
+class RequestLog:
+    """
+    A background writer for :class:`QueueLogRoller`, shared by all of a server's connections.
+
+    Every request's latency goes into a histogram for its :func:`endpoint`.
+    One request in ``sample``, and every request that fails, is put on a bounded queue;
+    when the queue is full, the record is dropped and counted, instead of making the request wait.
+    The writer thread formats the records and writes them to ``target``.
+    Every ``report_seconds``, and when it stops, it writes a summary of the histograms.
+    """
+
+    def __init__(
+        self,
+        target: TextIO = sys.stdout,
+        sample: int = 100,
+        maxsize: int = 10_000,
+        report_seconds: float | None = 60.0,
+    ) -> None:
+        if sample < 1:
+            raise ValueError(f"sample={sample}, but one request in {sample} can't be logged")
+        self.target = target
+        self.sample = sample
+        self.report_seconds = report_seconds
+        self.queue: queue.Queue[RequestRecord | None] = queue.Queue(maxsize)
+        self.histograms: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.requests = 0
+        self.dropped = 0
+        # record() is called from the server's executor threads.
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.write, name="request-log", daemon=True)
+
+    def pipeline(self, remote_addr: Address, encoding: Encoding) -> Roller:
+        """A :data:`Pipeline` like :func:`logged_zip_pipeline`, logging to this."""
+        return QueueLogRoller(ZipRoller(dice.dice_roller, *encoding), remote_addr, self)
+
+    def record(self, record: RequestRecord) -> None:
+        with self.lock:
+            self.histograms[endpoint(record.request)].record(record.seconds)
+            self.requests += 1
+            if record.error is None and self.requests % self.sample:
+                return
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Write everything that's been queued, and a final report."""
+        # The queue may be full; the writer is still emptying it.
+        self.queue.put(None)
+        self.thread.join()
+
+    def write(self) -> None:
+        """Runs in the writer thread."""
+        next_report = time.monotonic() + (self.report_seconds or 0.0)
+        while True:
+            timeout = None
+            if self.report_seconds is not None:
+                timeout = max(0.0, next_report - time.monotonic())
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            else:
+                if record is None:
+                    break
+                self.target.write(self.format(record))
+            if self.report_seconds is not None and time.monotonic() >= next_report:
+                self.report()
+                next_report = time.monotonic() + self.report_seconds
+            if self.queue.empty():
+                self.target.flush()
+        self.report()
+        self.target.flush()
+
+    def format(self, record: RequestRecord) -> str:
+        microseconds = 1e6 * record.seconds
+        if record.error is not None:
+            return (
+                f"Failed {record.request!r} from {record.remote_addr}: "
+                f"{record.error!r} in {microseconds:.0f}us\n"
+            )
+        return (
+            f"Sending {record.response!r} for {record.request!r} "
+            f"to {record.remote_addr} in {microseconds:.0f}us\n"
+        )
+
+    def report(self) -> None:
+        for name, histogram in sorted(self.histograms.copy().items()):
+            self.target.write(f"{name}: {histogram.summary()}\n")
+        self.target.write(
+            f"{self.requests} requests, 1 in {self.sample} logged, {self.dropped} dropped\n"
+        )
+
+
+class QueueLogRoller:
+    """
+    A :class:`LogRoller` that doesn't wait for the terminal:
+    it times the request and hands the record to a :class:`RequestLog`.
+    """
+
+    def __init__(
+        self, dice: Callable[[bytes], bytes], remote_addr: Address, log: RequestLog
+    ) -> None:
+        self.dice_roller = dice
+        self.remote_addr = remote_addr
+        self.log = log
+
+    def __call__(self, request: bytes) -> bytes:
+        dice_roller = self.dice_roller
+        start = time.perf_counter()
+        try:
+            response = dice_roller(request)
+        except Exception as ex:
+            seconds = time.perf_counter() - start
+            self.log.record(RequestRecord(self.remote_addr, request, None, ex, seconds))
+            raise
+        seconds = time.perf_counter() - start
+        self.log.record(RequestRecord(self.remote_addr, request, response, None, seconds))
+        return response
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes | None:
+    """The next frame, or None when the peer closes the connection between frames."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as ex:
+        if ex.partial:
+            raise
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_REQUEST:
+        raise ValueError(f"Frame of {size} bytes is too big")
+    return await reader.readexactly(size)
+
+
+def frame(payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class DiceServer:
+    """
+    Serve :func:`dice.dice_roller` to many clients at once.
+
+    A connection stays open for any number of framed requests.
+    The ``pipeline`` builds the roller for each connection,
+    so the :class:`ZipRoller` and :class:`LogRoller` decorators can wrap it.
+
+    A client can start with an :data:`ACCEPT` request, listing the codecs it can decode.
+    The server answers ``b"Encoding <codec>"`` with the first one it also knows,
+    and compresses that connection's responses with it, at ``level``,
+    leaving responses shorter than ``threshold`` uncompressed.
+    Other clients get the :data:`LEGACY` encoding.
+
+    A request for more than ``max_rolls`` rolls, or more than ``max_dice`` dice,
+    gets an error instead, so one client can't tie up the executor.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline = zip_pipeline,
+        level: int = 1,
+        threshold: int = 64,
+        max_rolls: int = 100_000,
+        max_dice: int = 1_000,
+    ) -> None:
+        self.pipeline = pipeline
+        self.level = level
+        self.threshold = threshold
+        self.max_rolls = max_rolls
+        self.max_dice = max_dice
+        self.connections = 0
+        self.requests = 0
+
+    def negotiate(self, request: bytes) -> Encoding:
+        """
+        >>> DiceServer(threshold=64).negotiate(b"Accept br deflate gzip")
+        Encoding(codec='deflate', level=1, threshold=64)
+        """
+        offered = request.removeprefix(ACCEPT).decode("ascii", "replace").split()
+        codec = next((c for c in offered if c in CODECS), "identity")
+        return Encoding(codec, self.level, self.threshold)
+
+    def check(self, request: bytes) -> None:
+        """
+        Reject a request over this server's limits before rolling anything.
+        A request that doesn't parse is left for the roller to report.
+
+        >>> DiceServer(max_rolls=10).check(b"Dice 11 d6")
+        Traceback (most recent call last):
+        ...
+        ValueError: More than 10 rolls in b'Dice 11 d6'
+        """
+        request_text = request.decode("utf-8", "replace")
+        if (request_match := dice.REQUEST_PATTERN.match(request_text)) is None:
+            return
+        if int(request_match.group(2)) > self.max_rolls:
+            raise ValueError(f"More than {self.max_rolls} rolls in {request!r}")
+        dice_match = dice.DICE_PATTERN.match(request_match.group(3))
+        if dice_match is not None and int(dice_match.group("n") or 1) > self.max_dice:
+            raise ValueError(f"More than {self.max_dice} dice in {request!r}")
+
+    def respond(self, roller: Roller, request: bytes) -> bytes:
+        """Runs in the loop's default executor, so a slow request doesn't hold up the others."""
+        try:
+            self.check(request)
+            response = roller(request)
+            if len(response) > MAX_RESPONSE:
+                raise ValueError(f"Response of {len(response)} bytes is too big")
+            return response
+        except (ValueError, KeyError) as ex:
+            return repr(ex).encode("utf-8")
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        try:
+            request = await read_frame(reader)
+            encoding = LEGACY
+            if request is not None and request.startswith(ACCEPT):
+                encoding = self.negotiate(request)
+                writer.write(frame(f"Encoding {encoding.codec}".encode("ascii")))
+                request = await read_frame(reader)
+            roller = self.pipeline(writer.get_extra_info("peername"), encoding)
+            while request is not None:
+                self.requests += 1
+                response = await loop.run_in_executor(None, self.respond, roller, request)
+                writer.write(frame(response))
+                await writer.drain()
+                request = await read_frame(reader)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+
+def main_4(
+    port: int = 2401,
+    pipeline: Pipeline = zip_pipeline,
+    level: int = 1,
+    threshold: int = 64,
+    max_rolls: int = 100_000,
+    max_dice: int = 1_000,
+) -> None:
+    server = DiceServer(pipeline, level, threshold, max_rolls, max_dice)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(server.serve("localhost", port))
+
+
+PIPELINES: dict[str, Pipeline] = {
+    "plain": plain_pipeline,
+    "zip": zip_pipeline,
+    "log": logged_zip_pipeline,
+}
+
+
+def positive(text: str) -> int:
+    if (value := int(text)) < 1:
+        raise argparse.ArgumentTypeError(f"{value} isn't positive")
+    return value
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    # --server sync is the original one-client-at-a-time server, with the unframed protocol
+    # of socket_client.py --unframed. socket_client.py's other modes need the async server.
+    parser.add_argument("--server", choices=["async", "sync"], default="async")
+    parser.add_argument("--pipeline", choices=[*PIPELINES, "queue"], default="zip")
+    parser.add_argument(
+        "--sample", type=positive, default=100, help="log 1 in N requests with queue"
+    )
+    parser.add_argument("--port", type=int, default=2401)
+    parser.add_argument("--level", type=int, default=1, help="for negotiated compression")
+    parser.add_argument(
+        "--threshold", type=int, default=64, help="smallest negotiated response to compress"
+    )
+    parser.add_argument("--max-rolls", type=positive, default=100_000, help="per request")
+    parser.add_argument("--max-dice", type=positive, default=1_000, help="per roll")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main_3()
+    options = get_options()
+    if options.server == "sync":
+        main_3(options.port)
+    elif options.pipeline == "queue":
+        request_log = RequestLog(sample=options.sample)
+        request_log.start()
+        try:
+            main_4(
+                options.port,
+                request_log.pipeline,
+                options.level,
+                options.threshold,
+                options.max_rolls,
+                options.max_dice,
+            )
+        finally:
+            request_log.stop()
+    else:
+        main_4(
+            options.port,
+            PIPELINES[options.pipeline],
+            options.level,
+            options.threshold,
+            options.max_rolls,
+            options.max_dice,
+        )
@@ -7,7 +7,7 @@ import random
 import json
 import time
 from dice import Dice
-from typing import Protocol
+from typing import NamedTuple, Protocol
 
 
 class Observer(Protocol):
@@ -15,9 +15,36 @@ class Observer(Protocol):
         ...
 
 
+type Hand = list[int]
+
+
+class Delta(NamedTuple):
+    """
+    One change to an observable history:
+    with ``reset``, a new history starts with the ``added`` hands;
+    otherwise, the ``added`` hands are appended to it.
+    ``sequence`` counts the changes.
+    """
+
+    sequence: int
+    reset: bool
+    added: list[Hand]
+
+
+class DeltaObserver(Protocol):
+    def __call__(self, delta: Delta) -> None:
+        ...
+
+
 class Observable:
+    """
+    Plain observers are called with no arguments, and look at the observable's state.
+    Delta observers are given only what changed, so their cost doesn't grow with the state.
+    """
+
     def __init__(self) -> None:
         self._observers: list[Observer] = []
+        self._delta_observers: list[DeltaObserver] = []
 
     def attach(self, observer: Observer) -> None:
         self._observers.append(observer)
@@ -25,12 +52,18 @@ class Observable:
     def detach(self, observer: Observer) -> None:
         self._observers.remove(observer)
 
-    def _notify_observers(self) -> None:
-        for observer in self._observers:
-            observer()
+    def attach_delta(self, observer: DeltaObserver) -> None:
+        self._delta_observers.append(observer)
 
+    def detach_delta(self, observer: DeltaObserver) -> None:
+        self._delta_observers.remove(observer)
 
-type Hand = list[int]
+    def _notify_observers(self, delta: Delta | None = None) -> None:
+        for observer in self._observers:
+            observer()
+        if delta is not None:
+            for delta_observer in self._delta_observers:
+                delta_observer(delta)
 
 
 class ZonkHandHistory(Observable):
@@ -39,21 +72,30 @@ class ZonkHandHistory(Observable):
         self.player = player
         self.dice_set = dice_set
         self.rolls: list[Hand]
+        self.changes = 0
 
     def start(self) -> Hand:
         self.dice_set.roll()
         self.rolls = [self.dice_set.dice]
-        self._notify_observers()  # State change
+        self.changes += 1
+        self._notify_observers(Delta(self.changes, True, [self.dice_set.dice]))  # State change
         return self.dice_set.dice
 
     def roll(self) -> Hand:
         self.dice_set.roll()
         self.rolls.append(self.dice_set.dice)
-        self._notify_observers()  # State change
+        self.changes += 1
+        self._notify_observers(Delta(self.changes, False, [self.dice_set.dice]))  # State change
         return self.dice_set.dice
 
 
 class SaveZonkHand(Observer):
+    """
+    Saves the whole history on every change,
+    so a game of n rolls serializes n * (n + 1) / 2 hands.
+    :class:`AppendZonkHand` serializes each hand once.
+    """
+
     def __init__(self, hand: ZonkHandHistory) -> None:
         self.hand = hand
         self.count = 0
@@ -86,6 +128,135 @@ class ThreePairZonkHand:
             print("3 Pair Zonk!")
 
 
+import sys
+import threading
+from concurrent import futures
+from typing import TextIO
+
+
+class AppendZonkHand:
+    """
+    Delta observer of ZonkHandHistory: one JSON line for each change,
+    with only the new hands. :func:`replay` rebuilds the history from the lines.
+    """
+
+    def __init__(self, player: str, target: TextIO = sys.stdout) -> None:
+        self.player = player
+        self.target = target
+
+    def __call__(self, delta: Delta) -> None:
+        message = {
+            "player": self.player,
+            "sequence": delta.sequence,
+            "reset": delta.reset,
+            "hands": delta.added,
+            "time": time.time(),
+        }
+        self.target.write(json.dumps(message) + "\n")
+
+
+def replay(lines: list[str]) -> list[Hand]:
+    """The history after the changes written by :class:`AppendZonkHand`."""
+    rolls: list[Hand] = []
+    for line in lines:
+        message = json.loads(line)
+        if message["reset"]:
+            rolls = []
+        rolls.extend(message["hands"])
+    return rolls
+
+
+class CoalescingObserver:
+    """
+    Delta observer that collects a burst of changes,
+    and passes them on to another delta observer as one :class:`Delta`.
+
+    The collected changes are passed on when there are ``max_pending`` of them,
+    ``max_delay`` seconds after the first one was collected, or when :meth:`flush` is called.
+    The delay is a :class:`threading.Timer`, so the last burst of a game is passed on
+    even if no more changes arrive; the timer's thread calls the observer.
+    A reset discards the changes collected before it; they no longer matter.
+    """
+
+    def __init__(
+        self,
+        observer: DeltaObserver,
+        max_pending: int = 100,
+        max_delay: float = 1.0,
+    ) -> None:
+        self.observer = observer
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        # Held while the observer is called, so changes are passed on in order.
+        self.lock = threading.RLock()
+        self.pending: Delta | None = None
+        self.count = 0
+        self.timer: threading.Timer | None = None
+
+    def __call__(self, delta: Delta) -> None:
+        with self.lock:
+            if self.pending is None or delta.reset:
+                self.pending = Delta(delta.sequence, delta.reset, list(delta.added))
+            else:
+                self.pending.added.extend(delta.added)
+                self.pending = self.pending._replace(sequence=delta.sequence)
+            self.count += 1
+            if self.count >= self.max_pending:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self.flush)
+                self.timer.daemon = False
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending is not None:
+                pending, self.pending, self.count = self.pending, None, 0
+                self.observer(pending)
+
+
+class ExecutorObserver:
+    """
+    Delta observer that calls a slow delta observer in an executor,
+    so the observable doesn't wait for it.
+
+    With the default, a one-thread :class:`concurrent.futures.ThreadPoolExecutor`,
+    the changes arrive in order. Exceptions are collected in :attr:`errors`.
+    """
+
+    def __init__(
+        self, observer: DeltaObserver, executor: futures.Executor | None = None
+    ) -> None:
+        self.observer = observer
+        self.executor = executor or futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="observer"
+        )
+        self.pending: list[futures.Future[None]] = []
+        self.errors: list[BaseException] = []
+
+    def __call__(self, delta: Delta) -> None:
+        future = self.executor.submit(self.observer, delta)
+        future.add_done_callback(self.done)
+        self.pending = [f for f in self.pending if not f.done()]
+        self.pending.append(future)
+
+    def done(self, future: "futures.Future[None]") -> None:
+        if (error := future.exception()) is not None:
+            self.errors.append(error)
+
+    def wait(self) -> None:
+        """Wait for the changes submitted so far to be observed."""
+        futures.wait(self.pending)
+        self.pending = []
+
+    def close(self) -> None:
+        self.wait()
+        self.executor.shutdown(wait=True)
+
+
 test_hand_history = """
 >>> from unittest.mock import Mock, call
 >>> mock_observer = Mock()
@@ -160,6 +331,76 @@ SaveZonkHand {'player': 'David', 'sequence': 2, 'hands': '[[2, 3, 4, 4, 6, 6], [
 
 """
 
+test_append_zonk = """
+>>> import io
+>>> random.seed(42)
+
+>>> player = ZonkHandHistory("Bo", Dice.from_text("6d6"))
+>>> saved = io.StringIO()
+>>> player.attach_delta(AppendZonkHand("Bo", saved))
+>>> player.start()
+[1, 1, 2, 3, 6, 6]
+>>> player.roll()
+[1, 2, 2, 6, 6, 6]
+>>> saved.getvalue()
+'{"player": "Bo", "sequence": 1, "reset": true, "hands": [[1, 1, 2, 3, 6, 6]], "time": ...}\\n{"player": "Bo", "sequence": 2, "reset": false, "hands": [[1, 2, 2, 6, 6, 6]], "time": ...}\\n'
+>>> replay(saved.getvalue().splitlines()) == player.rolls
+True
+"""
+
+test_coalescing_observer = """
+>>> from unittest.mock import Mock
+>>> random.seed(42)
+
+>>> player = ZonkHandHistory("Bo", Dice.from_text("6d6"))
+>>> delivered = Mock()
+>>> coalesce = CoalescingObserver(delivered, max_pending=3)
+>>> player.attach_delta(coalesce)
+>>> hands = [player.start(), player.roll(), player.roll(), player.roll()]
+>>> delivered.call_args.args[0] == Delta(3, True, hands[:3])
+True
+>>> coalesce.flush()
+>>> delivered.call_args.args[0] == Delta(4, False, hands[3:])
+True
+>>> _ = player.roll()
+>>> _ = player.start()
+>>> coalesce.flush()
+>>> delivered.call_args.args[0] == Delta(6, True, [player.rolls[0]])
+True
+"""
+
+test_coalescing_trailing_burst = """
+>>> from unittest.mock import Mock
+>>> random.seed(42)
+
+>>> player = ZonkHandHistory("Bo", Dice.from_text("6d6"))
+>>> delivered = Mock()
+>>> player.attach_delta(CoalescingObserver(delivered, max_delay=0.05))
+>>> hands = [player.start(), player.roll()]
+>>> delivered.call_count
+0
+>>> time.sleep(0.25)
+>>> delivered.call_args.args[0] == Delta(2, True, hands)
+True
+"""
+
+test_executor_observer = """
+>>> import io
+>>> random.seed(42)
+
+>>> player = ZonkHandHistory("Bo", Dice.from_text("6d6"))
+>>> saved = io.StringIO()
+>>> in_background = ExecutorObserver(AppendZonkHand("Bo", saved))
+>>> player.attach_delta(in_background)
+>>> for _ in range(10):
+...     hand = player.roll() if player.changes else player.start()
+>>> in_background.close()
+>>> replay(saved.getvalue().splitlines()) == player.rolls
+True
+>>> in_background.errors
+[]
+"""
+
 
 def find_seed() -> None:
     d = Dice.from_text("6d6")
@@ -0,0 +1,89 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+
+A latency histogram that's cheap enough to update on every request.
+
+Latencies go into logarithmic buckets: ``per_doubling`` buckets between
+each power of two microseconds, so a bucket is about 9% wide with the default of 8.
+Percentiles are reported as the upper edge of their bucket.
+The memory used depends on the range of latencies, not on how many there are.
+"""
+from collections import defaultdict
+from math import log2
+
+
+class LatencyHistogram:
+    """
+    >>> h = LatencyHistogram()
+    >>> for microseconds in range(1, 1001):
+    ...     h.record(microseconds / 1_000_000)
+    >>> h.count
+    1000
+    >>> round(h.percentile(50) * 1e6)
+    512
+    >>> round(h.percentile(99) * 1e6)
+    1000
+    >>> h.summary()
+    'count 1000  mean 500.5us  p50 512.0us  p95 1000.0us  p99 1000.0us  max 1000.0us'
+    """
+
+    def __init__(self, per_doubling: int = 8, floor: float = 1e-6) -> None:
+        self.per_doubling = per_doubling
+        self.floor = floor
+        self.log_floor = log2(floor)
+        self.counts: defaultdict[int, int] = defaultdict(int)
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds > self.floor:
+            self.counts[int((log2(seconds) - self.log_floor) * self.per_doubling) + 1] += 1
+        else:
+            self.counts[0] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.copy().values())
+
+    def upper(self, index: int) -> float:
+        """The upper edge of a bucket, in seconds."""
+        if index == 0:
+            return self.floor
+        return float(self.floor * 2 ** (index / self.per_doubling))
+
+    def percentile(self, p: float) -> float:
+        """The latency, in seconds, that ``p`` percent of the latencies are at or under."""
+        # A copy, in case another thread is recording.
+        counts = sorted(self.counts.copy().items())
+        needed = p / 100 * sum(count for _, count in counts)
+        if not needed:
+            return 0.0
+        seen = 0
+        for index, count in counts:
+            seen += count
+            if seen >= needed:
+                return min(self.upper(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add another histogram's counts; it must have the same buckets."""
+        for index, count in other.counts.copy().items():
+            self.counts[index] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> str:
+        count = self.count
+        mean = self.total / count if count else 0.0
+        return (
+            f"count {count}  mean {1e6 * mean:.1f}us  "
+            f"p50 {1e6 * self.percentile(50):.1f}us  "
+            f"p95 {1e6 * self.percentile(95):.1f}us  "
+            f"p99 {1e6 * self.percentile(99):.1f}us  "
+            f"max {1e6 * self.max:.1f}us"
+        )
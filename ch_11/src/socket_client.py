@@ -9,6 +9,7 @@ import socket
 
 
 def main_zip() -> None:
+    """One request, in the original unframed protocol of ``dice_server.py --server sync``."""
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.connect(("localhost", 2401))
     count = input("How many rolls: ") or "1"
@@ -23,6 +24,10 @@ def main_zip() -> None:
 
 
 def main() -> None:
+    """
+    The unframed protocol of ``dice_server.py --server sync``, from before the server
+    compressed its responses; :func:`main_zip` decodes what it sends now.
+    """
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.connect(("localhost", 2401))
     count = input("How many rolls: ") or "1"
@@ -34,5 +39,232 @@ def main() -> None:
     server.close()
 
 
+import argparse
+import asyncio
+from collections import deque
+import statistics
+import sys
+import time
+from types import TracebackType
+
+from dice_server import ACCEPT, ResponseDecoder, frame, read_frame
+
+
+class DiceConnection:
+    """
+    One persistent connection to :class:`dice_server.DiceServer`, with pipelining.
+
+    Requests are written as soon as they're made, without waiting for earlier responses.
+    The server answers a connection's requests in order,
+    so each response goes to the oldest request still waiting for one.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, encoding: str
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.encoding = encoding
+        self.decode = ResponseDecoder()
+        self.waiting: deque[asyncio.Future[bytes]] = deque()
+        self.responses = asyncio.create_task(self.read_responses())
+
+    @classmethod
+    async def open(
+        cls, host: str, port: int, accept: bytes | None = b"deflate gzip"
+    ) -> "DiceConnection":
+        """
+        Connect, and negotiate compression if ``accept`` lists any codecs.
+        An unframed server, like ``dice_server.py --server sync``,
+        answers the negotiation with something that isn't a frame.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        encoding = "gzip"
+        if accept is not None:
+            writer.write(frame(ACCEPT + accept))
+            try:
+                reply = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ValueError):
+                reply = None
+            if reply is None or not reply.startswith(b"Encoding "):
+                writer.close()
+                raise ConnectionError(
+                    f"No framed dice server at {host}:{port}; "
+                    f"start it with dice_server.py --server async"
+                )
+            encoding = reply.decode("ascii").removeprefix("Encoding ")
+        return cls(reader, writer, encoding)
+
+    async def request(self, request: bytes) -> bytes:
+        """The decoded response; errors come back as the ``repr()`` of the exception."""
+        if self.responses.done():
+            raise ConnectionError("Connection is closed")
+        future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.writer.write(frame(request))
+        await self.writer.drain()
+        return await future
+
+    async def read_responses(self) -> None:
+        error: Exception = ConnectionError("Server closed the connection")
+        try:
+            while (response := await read_frame(self.reader)) is not None:
+                # Decoded even if the request was cancelled; the deflate stream needs every piece.
+                decoded = self.decode(response)
+                if not (future := self.waiting.popleft()).done():
+                    future.set_result(decoded)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as ex:
+            error = ex
+        finally:
+            while self.waiting:
+                if not (future := self.waiting.popleft()).done():
+                    future.set_exception(error)
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.responses.cancel()
+        await asyncio.gather(self.responses, return_exceptions=True)
+
+
+class DiceClient:
+    """
+    A pool of :class:`DiceConnection`, used like this::
+
+        async with DiceClient("localhost", 2401) as client:
+            print(await client.roll(6, "4d6d1"))
+
+    Each request goes to the connection with the fewest requests waiting.
+    Connections that have closed are replaced before the next request.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 2401,
+        connections: int = 4,
+        accept: bytes | None = b"deflate gzip",
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.size = connections
+        self.accept = accept
+        self.pool: list[DiceConnection] = []
+        self.reopening = asyncio.Lock()
+
+    async def open(self) -> None:
+        """Open connections until the pool is full again."""
+        async with self.reopening:
+            self.pool = [c for c in self.pool if not c.responses.done()]
+            self.pool.extend(
+                await asyncio.gather(
+                    *(
+                        DiceConnection.open(self.host, self.port, self.accept)
+                        for _ in range(self.size - len(self.pool))
+                    )
+                )
+            )
+
+    async def request(self, request: bytes) -> bytes:
+        if any(c.responses.done() for c in self.pool):
+            await self.open()
+        connection = min(self.pool, key=lambda c: len(c.waiting))
+        return await connection.request(request)
+
+    async def roll(self, count: int, pattern: str, model: str = "Dice") -> str:
+        response = await self.request(f"{model} {count} {pattern}".encode("utf-8"))
+        return response.decode("utf-8")
+
+    async def close(self) -> None:
+        await asyncio.gather(*(connection.close() for connection in self.pool))
+        self.pool = []
+
+    async def __aenter__(self) -> "DiceClient":
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+
+async def bench(
+    client: DiceClient, request: bytes, requests: int, concurrency: int
+) -> tuple[float, list[float]]:
+    """
+    Send ``requests`` requests, with ``concurrency`` of them in flight at a time.
+    The elapsed time, and each request's latency.
+    """
+    latencies: list[float] = []
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            await client.request(request)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as group:
+        for _ in range(concurrency):
+            group.create_task(worker())
+    return time.perf_counter() - start, latencies
+
+
+async def main_bench(options: argparse.Namespace) -> None:
+    async with DiceClient(options.host, options.port, options.connections) as client:
+        elapsed, latencies = await bench(
+            client, options.request, options.requests, options.concurrency
+        )
+        encoding = client.pool[0].encoding
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[-1] if len(latencies) > 1 else latencies[0]
+    print(
+        f"{options.connections} connections ({encoding}), {options.concurrency} in flight: "
+        f"{len(latencies) / elapsed:,.0f} requests/sec  "
+        f"p50 {1000 * p50:.3f}ms  p99 {1000 * p99:.3f}ms"
+    )
+
+
+def positive(text: str) -> int:
+    if (value := int(text)) < 1:
+        raise argparse.ArgumentTypeError(f"{value} isn't positive")
+    return value
+
+
+async def main_framed(host: str, port: int) -> None:
+    """Like :func:`main_zip`, for the framed protocol of ``dice_server.py``'s default server."""
+    count = input("How many rolls: ") or "1"
+    pattern = input("Dice pattern nd6[dk+-]a: ") or "d6"
+    async with DiceClient(host, port, connections=1) as client:
+        print(await client.roll(int(count), pattern))
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bench", action="store_true", help="measure the server's throughput")
+    parser.add_argument(
+        "--unframed", action="store_true", help="roll once, with dice_server.py --server sync"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2401)
+    parser.add_argument("--requests", type=positive, default=10_000)
+    parser.add_argument("--concurrency", type=positive, default=100)
+    parser.add_argument("--connections", type=positive, default=4)
+    parser.add_argument("--request", type=str.encode, default=b"Dice 6 4d6d1")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main_zip()
+    options = get_options()
+    # Only --unframed talks to dice_server.py --server sync; the rest need the default server.
+    if options.bench:
+        asyncio.run(main_bench(options))
+    elif options.unframed:
+        main_zip()
+    else:
+        asyncio.run(main_framed(options.host, options.port))
@@ -3,6 +3,7 @@ Python 3 Object-Oriented Programming
 
 Chapter 11. Common Design Patterns
 """
+import ast
 import random
 import pytest
 import dice
@@ -49,3 +50,44 @@ def test_dice_roller(fixed_seed):
         dice.dice_roller(b"nothing recognizable")
     with pytest.raises(KeyError):
         dice.dice_roller(b"bad 2 2d6")
+    response_3 = dice.dice_roller(b"Dice 100000 4d6k3")
+    assert len(ast.literal_eval(response_3.decode().partition(" = ")[2])) == 100_000
+
+
+def test_compile_dice_cache():
+    dice.compile_dice.cache_clear()
+    plan = dice.compile_dice("4d6k3+2")
+    assert plan == dice.RollPlan(4, 6, ((dice.Keep, 3), (dice.Plus, 2)))
+    assert dice.Dice.from_text("4d6k3+2").adjustments[1].amount == 3
+    assert dice.compile_dice("4d6k3+2") is plan
+    with pytest.raises(ValueError):
+        dice.compile_dice("nothing")
+    info = dice.compile_dice.cache_info()
+    assert (info.hits, info.misses) == (2, 2)
+
+
+@pytest.mark.parametrize(
+    "batch_class",
+    [
+        dice.ListBatch,
+        pytest.param(dice.ArrayBatch, marks=pytest.mark.skipif(dice.np is None, reason="needs numpy")),
+    ],
+)
+def test_roll_many(monkeypatch, batch_class):
+    monkeypatch.setattr(dice, "new_batch", batch_class)
+    d = dice.Dice.from_text("4d6k3+2")
+    rolls = d.roll_many(20_000, seed=42)
+    assert rolls == d.roll_many(20_000, seed=42)
+    assert min(rolls) >= 5 and max(rolls) <= 20
+    # 4d6, keep the lowest 3, plus 2; the exact mean is 11347/1296 + 2.
+    assert abs(sum(rolls) / len(rolls) - (11347 / 1296 + 2)) < 0.05
+    assert dice.Dice.from_text("3d1d1-1").roll_many(3) == [1, 1, 1]
+    assert dice.Dice2.from_text("").roll_many(5, seed=1) == dice.Dice2(2, 6).roll_many(5, seed=1)
+
+
+def test_dice_roller_bulk(fixed_seed):
+    response = dice.dice_roller(f"Dice {dice.BULK_ROLLS} 4d6d1".encode())
+    random.seed(42)
+    assert dice.dice_roller(f"Dice {dice.BULK_ROLLS} 4d6d1".encode()) == response
+    numbers = ast.literal_eval(response.decode().partition(" = ")[2])
+    assert len(numbers) == dice.BULK_ROLLS
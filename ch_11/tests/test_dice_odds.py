@@ -0,0 +1,54 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 11. Common Design Patterns
+"""
+from collections import Counter
+from fractions import Fraction
+import itertools
+import pytest
+import dice
+import dice_odds
+
+
+def brute_force(dice_text: str) -> dict[int, Fraction]:
+    """Apply the adjustments to every possible roll."""
+    d = dice.Dice.from_text(dice_text)
+    roll, *adjustments = d.adjustments
+    totals: Counter[int] = Counter()
+    for faces in itertools.product(range(1, roll.d + 1), repeat=roll.n):
+        d.dice = sorted(faces)
+        d.modifier = 0
+        for a in adjustments:
+            a.apply(d)
+        totals[sum(d.dice) + d.modifier] += 1
+    outcomes = roll.d**roll.n
+    return {total: Fraction(ways, outcomes) for total, ways in sorted(totals.items())}
+
+
+@pytest.mark.parametrize(
+    "dice_text",
+    ["d8", "3d4", "4d6k3+2", "4d6d1", "5d4d1k2-1", "3d6k5", "2d6d3", "4d5d1d1", "5d3k4k2+1"],
+)
+def test_distribution(dice_text):
+    odds = dice_odds.Distribution.from_text(dice_text)
+    assert dict(odds) == brute_force(dice_text)
+
+
+def test_distribution_queries():
+    odds = dice_odds.Distribution.from_text("2d6")
+    assert odds.probability(7) == Fraction(1, 6)
+    assert odds.probability(1) == 0
+    assert odds.probability(13) == 0
+    assert odds.at_least(2) == 1
+    assert odds.at_least(12) == Fraction(1, 36)
+    assert odds.mean == 7
+    assert dict(dice_odds.Distribution.from_dice(dice.Dice2(2, 6))) == dict(odds)
+
+
+def test_window_counts_cache():
+    dice_odds.window_counts.cache_clear()
+    dice_odds.Distribution.from_text("4d6k3")
+    dice_odds.Distribution.from_text("4d6k3+2")
+    info = dice_odds.window_counts.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
@@ -3,8 +3,10 @@ Python 3 Object-Oriented Programming
 
 Chapter 11. Common Design Patterns
 """
+import asyncio
 import gzip
 import io
+import struct
 from unittest.mock import Mock, call, sentinel
 import dice_server
 import pytest
@@ -79,3 +81,140 @@ def test_dice_response(mock_ZipRoller, mock_socket, mock_dice):
         call(b'response')
     ]
 
+
+
+def test_read_frame():
+    async def read_all(data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        frames = []
+        while (payload := await dice_server.read_frame(reader)) is not None:
+            frames.append(payload)
+        return frames
+
+    data = dice_server.frame(b"one") + dice_server.frame(b"") + dice_server.frame(b"three")
+    assert asyncio.run(read_all(data)) == [b"one", b"", b"three"]
+    with pytest.raises(asyncio.IncompleteReadError):
+        asyncio.run(read_all(data[:-1]))
+    with pytest.raises(ValueError):
+        asyncio.run(read_all(struct.pack(">L", dice_server.MAX_REQUEST + 1)))
+
+
+def test_dice_server(monkeypatch):
+    monkeypatch.setattr(dice_server.dice, "dice_roller", Mock(side_effect=[b"one", KeyError("x"), b"three"]))
+    server = dice_server.DiceServer(dice_server.zip_pipeline)
+
+    async def session():
+        listener = await asyncio.start_server(server.handle, "localhost", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("localhost", port)
+        responses = []
+        for request in [b"Dice 1 d6", b"Bad", b"Dice 1 d6"]:
+            writer.write(dice_server.frame(request))
+            responses.append(await dice_server.read_frame(reader))
+        writer.close()
+        await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+        return responses
+
+    one, error, three = asyncio.run(session())
+    # Like dice_response(), errors aren't compressed.
+    assert (gzip.decompress(one), error, gzip.decompress(three)) == (b"one", b"KeyError('x')", b"three")
+    assert server.requests == 3
+    assert server.connections == 0
+
+
+@pytest.mark.parametrize("codec", ["gzip", "deflate", "identity"])
+def test_zip_roller_codecs(codec):
+    responses = [b"x" * 10, b"Dice 6 4d6d1 = [13, 7, 18, 14, 4, 12]" * 4, b"y" * 100]
+    zr = dice_server.ZipRoller(Mock(side_effect=responses), codec, level=1, threshold=16)
+    frames = [zr(b"request") for _ in responses]
+    assert frames[0] == b"x" * 10
+    if codec == "identity":
+        assert frames == responses
+    else:
+        assert all(len(f) < len(r) for f, r in zip(frames[1:], responses[1:]))
+    decode = dice_server.ResponseDecoder()
+    assert [decode(f) for f in frames] == responses
+    with pytest.raises(ValueError):
+        dice_server.ZipRoller(Mock(), "br")
+
+
+def test_dice_server_negotiation(monkeypatch):
+    monkeypatch.setattr(dice_server.dice, "dice_roller", Mock(side_effect=[b"a" * 100, b"b"]))
+    server = dice_server.DiceServer(dice_server.zip_pipeline, level=1, threshold=10)
+
+    async def session():
+        listener = await asyncio.start_server(server.handle, "localhost", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("localhost", port)
+        responses = []
+        for request in [b"Accept br deflate", b"Dice 100 d6", b"Dice 1 d6"]:
+            writer.write(dice_server.frame(request))
+            responses.append(await dice_server.read_frame(reader))
+        writer.close()
+        await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+        return responses
+
+    encoding, big, small = asyncio.run(session())
+    assert encoding == b"Encoding deflate"
+    assert big.startswith(dice_server.DEFLATE_MARK)
+    assert small == b"b"
+    assert dice_server.ResponseDecoder()(big) == b"a" * 100
+    assert server.requests == 2
+
+
+def test_queue_log_roller():
+    target = io.StringIO()
+    log = dice_server.RequestLog(target, sample=2, report_seconds=None)
+    log.start()
+    roller = dice_server.QueueLogRoller(
+        Mock(side_effect=[b"one", b"two", ValueError("bad"), b"four"]), ("remote", 4021), log
+    )
+    for request in [b"Dice 1 d6", b"Dice 2 d6"]:
+        roller(request)
+    with pytest.raises(ValueError):
+        roller(b"Nonsense")
+    roller(b"Dice2 4 d6")
+    log.stop()
+    lines = target.getvalue().splitlines()
+    assert lines[0].startswith("Sending b'two' for b'Dice 2 d6' to ('remote', 4021) in ")
+    assert lines[1].startswith("Failed b'Nonsense' from ('remote', 4021): ValueError('bad') in ")
+    assert lines[2].startswith("Sending b'four' for b'Dice2 4 d6'")
+    assert [line.partition(":")[0] for line in lines[3:6]] == ["Dice", "Dice2", "other"]
+    assert lines[3].startswith("Dice: count 2  mean ")
+    assert lines[6] == "4 requests, 1 in 2 logged, 0 dropped"
+    assert log.histograms["Dice"].count == 2
+
+
+def test_dice_server_limits(monkeypatch):
+    server = dice_server.DiceServer(dice_server.plain_pipeline)
+    roller = dice_server.plain_pipeline(("remote", 4021), dice_server.LEGACY)
+    assert server.respond(roller, b"Dice 100000 4d6k3").startswith(b"Dice 100000 4d6k3 = [")
+    response = server.respond(roller, b"Dice 100001 d6")
+    assert response.startswith(b"ValueError(") and b"More than 100000 rolls" in response
+    response = server.respond(roller, b"Dice 1 1001d6")
+    assert response.startswith(b"ValueError(") and b"More than 1000 dice" in response
+    small = dice_server.DiceServer(dice_server.plain_pipeline, max_rolls=5, max_dice=2)
+    assert small.respond(roller, b"Dice 5 2d6").startswith(b"Dice 5 2d6 = [")
+    assert small.respond(roller, b"Dice 6 d6").startswith(b"ValueError(")
+    assert small.respond(roller, b"Dice 1 3d6").startswith(b"ValueError(")
+    monkeypatch.setattr(dice_server, "MAX_RESPONSE", 8)
+    assert server.respond(Mock(return_value=b"x" * 9), b"Dice 1 d6") == b"ValueError('Response of 9 bytes is too big')"
+
+
+def test_request_log_sample():
+    with pytest.raises(ValueError):
+        dice_server.RequestLog(io.StringIO(), sample=0)
+    with pytest.raises(SystemExit):
+        dice_server.get_options(["--pipeline", "queue", "--sample", "0"])
+    assert dice_server.get_options(["--sample", "5"]).sample == 5
+
+
+def test_get_options():
+    assert dice_server.get_options([]).server == "async"
+    assert dice_server.get_options(["--server", "sync"]).server == "sync"
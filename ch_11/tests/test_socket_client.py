@@ -3,8 +3,12 @@ Python 3 Object-Oriented Programming
 
 Chapter 11. Common Design Patterns
 """
+import asyncio
+import socket
+import threading
 from unittest.mock import Mock, call, sentinel
 import pytest
+import dice_server
 import socket_client
 
 @pytest.fixture
@@ -53,3 +57,72 @@ def test_client(mock_socket, mock_input, capsys):
     assert instance.close.mock_calls == [
         call()
     ]
+
+
+def test_dice_client(monkeypatch):
+    monkeypatch.setattr(dice_server.dice, "dice_roller", lambda request: request.upper() * 10)
+    server = dice_server.DiceServer(dice_server.zip_pipeline, threshold=64)
+
+    async def session():
+        listener = await asyncio.start_server(server.handle, "localhost", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with socket_client.DiceClient("localhost", port, connections=2) as client:
+            requests = [f"Dice {n} d6".encode() for n in range(50)]
+            responses = await asyncio.gather(*(client.request(r) for r in requests))
+            rolled = await client.roll(1, "d4")
+            encodings = [c.encoding for c in client.pool]
+            elapsed, latencies = await socket_client.bench(client, b"Dice 1 d6", 20, 5)
+        listener.close()
+        await listener.wait_closed()
+        return requests, responses, rolled, encodings, latencies
+
+    requests, responses, rolled, encodings, latencies = asyncio.run(session())
+    assert responses == [r.upper() * 10 for r in requests]
+    assert rolled == "DICE 1 D4" * 10
+    assert encodings == ["deflate", "deflate"]
+    assert len(latencies) == 20
+    assert server.requests == 71
+
+
+def test_dice_client_reconnects(monkeypatch):
+    monkeypatch.setattr(dice_server.dice, "dice_roller", lambda request: request)
+    server = dice_server.DiceServer(dice_server.zip_pipeline)
+
+    async def session():
+        listener = await asyncio.start_server(server.handle, "localhost", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with socket_client.DiceClient("localhost", port, connections=2) as client:
+            dead = client.pool[0]
+            dead.writer.transport.abort()
+            await asyncio.wait_for(asyncio.gather(dead.responses, return_exceptions=True), 1)
+            responses = [await client.request(b"Dice %d d6" % n) for n in range(4)]
+            pool = list(client.pool)
+        listener.close()
+        await listener.wait_closed()
+        return dead, pool, responses
+
+    dead, pool, responses = asyncio.run(session())
+    assert responses == [b"Dice %d d6" % n for n in range(4)]
+    assert dead not in pool and len(pool) == 2
+
+
+def test_dice_client_unframed_server():
+    listener = socket.create_server(("localhost", 0))
+    port = listener.getsockname()[1]
+
+    def serve_one():
+        client, addr = listener.accept()
+        with client:
+            dice_server.dice_response(client)
+
+    thread = threading.Thread(target=serve_one)
+    thread.start()
+    with listener:
+        with pytest.raises(ConnectionError, match="--server async"):
+            asyncio.run(socket_client.DiceClient("localhost", port, connections=1).open())
+        thread.join(timeout=5)
+
+
+def test_get_options():
+    assert not socket_client.get_options([]).unframed
+    assert socket_client.get_options(["--unframed"]).unframed
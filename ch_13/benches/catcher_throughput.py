@@ -0,0 +1,100 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 13.  Testing Object-Oriented Programs.
+
+Compare the throughput of the log catcher variants:
+this chapter's ``socketserver`` catcher in single, thread, and fork modes,
+and the asyncio catcher from Chapter 14.
+
+Each catcher runs as a separate process in a scratch directory.
+Client processes send numbered records with a ``logging.handlers.SocketHandler``.
+The elapsed time runs until the catcher's output file has all of the records.
+"""
+import argparse
+import logging
+import logging.handlers
+from multiprocessing import Process
+from pathlib import Path
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+CH_13 = Path(__file__).parent.parent / "src" / "log_catcher.py"
+CH_14 = Path(__file__).parent.parent.parent / "ch_14" / "src" / "log_catcher.py"
+PORT = 18842
+
+
+def client(client_id: int, records: int) -> None:
+    handler = logging.handlers.SocketHandler("localhost", PORT)
+    logger = logging.getLogger(f"bench_{client_id}")
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    for sequence in range(records):
+        logger.info("client %d record %d", client_id, sequence)
+    handler.close()
+
+
+def run(command: list[str], clients: int, records: int) -> tuple[int, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        server = subprocess.Popen(
+            command, cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        time.sleep(0.5)
+        assert server.poll() is None, f"{command} didn't start"
+        start = time.perf_counter()
+        workers = [Process(target=client, args=(c, records)) for c in range(clients)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        # Wait for the catcher to write everything, or to stop making progress.
+        target = Path(directory) / "one.log"
+        received, last_change = 0, time.perf_counter()
+        while received < clients * records and time.perf_counter() - last_change < 1.0:
+            time.sleep(0.010)
+            if (count := count_records(target)) != received:
+                received, last_change = count, time.perf_counter()
+        elapsed = last_change - start
+        server.send_signal(signal.SIGINT)
+        server.wait()
+        received = count_records(target)
+    return received, elapsed
+
+
+def count_records(target: Path) -> int:
+    return target.read_text().count("bench_")
+
+
+def main(clients: int, records: int, echo: bool) -> None:
+    quiet = [] if echo else ["--quiet"]
+    variants = {
+        "ch_13 single": [sys.executable, str(CH_13), "--mode", "single", *quiet],
+        "ch_13 thread": [sys.executable, str(CH_13), "--mode", "thread", *quiet],
+        "ch_13 fork": [sys.executable, str(CH_13), "--mode", "fork", *quiet],
+        "ch_14 asyncio": [sys.executable, str(CH_14)],
+    }
+    expected = clients * records
+    print(f"{clients} clients x {records} records = {expected} records, echo={echo}")
+    for name, command in variants.items():
+        received, elapsed = run(command, clients, records)
+        print(
+            f"{name:14s} {received / elapsed:10,.0f} records/sec "
+            f"{elapsed:7.3f}s, dropped {expected - received}"
+        )
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--records", type=int, default=2_000)
+    parser.add_argument("--echo", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = get_options()
+    main(options.clients, options.records, options.echo)
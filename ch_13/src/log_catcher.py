@@ -3,45 +3,170 @@ Python 3 Object-Oriented Programming
 
 Chapter 13.  Testing Object-Oriented Programs.
 """
+import argparse
+from contextlib import AbstractContextManager
 import json
+import multiprocessing
 from pathlib import Path
 import pickle
+import socket
 import socketserver
 import struct
 import sys
+import threading
 from typing import TextIO
 
 
+type Lock = AbstractContextManager[bool, None]
+
+
+class LockedWriter:
+    """
+    A buffered writer that can be shared by handlers in threads or forked processes.
+
+    Lines are collected in memory, and written to the target in one locked
+    write and flush when the buffer gets big, ``max_delay`` seconds after the first
+    line was collected, or when :meth:`flush` is called.
+    For forked processes, the lock must be a :func:`multiprocessing.Lock`, and
+    ``buffer_size`` should be 0: a child process is killed with whatever it has buffered.
+    The file offset is shared.
+    """
+
+    def __init__(
+        self,
+        target: TextIO,
+        lock: Lock | None = None,
+        buffer_size: int = 64 * 1024,
+        max_delay: float = 1.0,
+    ) -> None:
+        self.target = target
+        self.lock: Lock = lock or threading.Lock()
+        self.buffer_size = buffer_size
+        self.max_delay = max_delay
+        self.buffer: list[str] = []
+        self.buffered = 0
+        self.timer: threading.Timer | None = None
+
+    def write(self, text: str) -> None:
+        with self.lock:
+            self.buffer.append(text)
+            self.buffered += len(text)
+            if self.buffered >= self.buffer_size:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer:
+            self.target.write("".join(self.buffer))
+            self.target.flush()
+            self.buffer = []
+            self.buffered = 0
+
+
+def recv_exactly(request: socket.socket, size: int) -> bytes:
+    """
+    A ``recv(size)`` can return fewer than ``size`` bytes.
+    Keep reading until there are ``size`` bytes.
+    An empty result means the client closed the connection between frames.
+    """
+    data = request.recv(size)
+    if not data:
+        return data
+    chunks = [data]
+    received = len(data)
+    while received < size:
+        if not (data := request.recv(size - received)):
+            raise ConnectionError(f"Frame truncated at {received} of {size} bytes")
+        chunks.append(data)
+        received += len(data)
+    return b"".join(chunks)
+
+
 class LogDataCatcher(socketserver.BaseRequestHandler):
-    log_file: TextIO
+    log_file: TextIO | LockedWriter
     count: int = 0
+    echo: bool = True
     size_format = ">L"
     size_bytes = struct.calcsize(size_format)
 
     def handle(self) -> None:
-        size_header_bytes = self.request.recv(LogDataCatcher.size_bytes)
+        size_header_bytes = recv_exactly(self.request, LogDataCatcher.size_bytes)
         while size_header_bytes:
             payload_size = struct.unpack(LogDataCatcher.size_format, size_header_bytes)
-            print(f"{size_header_bytes=} {payload_size=}", file=sys.stderr)
-            payload_bytes = self.request.recv(payload_size[0])
-            print(f"{len(payload_bytes)=}", file=sys.stderr)
+            if self.echo:
+                print(f"{size_header_bytes=} {payload_size=}", file=sys.stderr)
+            payload_bytes = recv_exactly(self.request, payload_size[0])
+            if self.echo:
+                print(f"{len(payload_bytes)=}", file=sys.stderr)
             payload = pickle.loads(payload_bytes)
             LogDataCatcher.count += 1
-            print(f"{self.client_address[0]} {LogDataCatcher.count} {payload!r}")
+            if self.echo:
+                print(f"{self.client_address[0]} {LogDataCatcher.count} {payload!r}")
             self.log_file.write(json.dumps(payload) + "\n")
             try:
-                size_header_bytes = self.request.recv(LogDataCatcher.size_bytes)
+                size_header_bytes = recv_exactly(self.request, LogDataCatcher.size_bytes)
             except (ConnectionResetError, BrokenPipeError):
                 break
 
+    def finish(self) -> None:
+        self.log_file.flush()
+
+
+class ThreadingLogServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ForkingLogServer(socketserver.ForkingTCPServer):
+    allow_reuse_address = True
 
-def main(host: str, port: int, target: Path) -> None:
+
+def main(
+    host: str, port: int, target: Path, mode: str = "single", echo: bool = True
+) -> None:
+    LogDataCatcher.echo = echo
     with target.open("w") as unified_log:
-        LogDataCatcher.log_file = unified_log
-        with socketserver.TCPServer((host, port), LogDataCatcher) as server:
-            server.serve_forever()
+        if mode == "single":
+            LogDataCatcher.log_file = unified_log
+            server_class: type[socketserver.TCPServer] = socketserver.TCPServer
+        elif mode == "thread":
+            LogDataCatcher.log_file = LockedWriter(unified_log)
+            server_class = ThreadingLogServer
+        elif mode == "fork":
+            LogDataCatcher.log_file = LockedWriter(
+                unified_log, multiprocessing.Lock(), buffer_size=0
+            )
+            server_class = ForkingLogServer
+        else:
+            raise ValueError(f"Unknown mode {mode!r}")
+        with server_class((host, port), LogDataCatcher) as server:
+            try:
+                server.serve_forever()
+            finally:
+                # Lines from clients that are still connected.
+                LogDataCatcher.log_file.flush()
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["single", "thread", "fork"], default="single")
+    parser.add_argument("--quiet", dest="echo", action="store_false")
+    parser.add_argument("--port", type=int, default=18842)
+    parser.add_argument("--output", type=Path, default=Path("one.log"))
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    HOST, PORT = "localhost", 18842
-    main(HOST, PORT, Path("one.log"))
+    HOST = "localhost"
+    options = get_options()
+    main(HOST, options.port, options.output, options.mode, options.echo)
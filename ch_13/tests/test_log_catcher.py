@@ -0,0 +1,128 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 13.  Testing Object-Oriented Programs.
+"""
+import io
+import json
+import pickle
+import struct
+import time
+from unittest.mock import Mock, call
+
+import pytest
+
+import log_catcher
+
+
+def test_recv_exactly() -> None:
+    request = Mock(recv=Mock(side_effect=[b"ab", b"c", b"d"]))
+    assert log_catcher.recv_exactly(request, 4) == b"abcd"
+    assert request.recv.mock_calls == [call(4), call(2), call(1)]
+
+
+def test_recv_exactly_closed() -> None:
+    request = Mock(recv=Mock(return_value=b""))
+    assert log_catcher.recv_exactly(request, 4) == b""
+
+
+def test_recv_exactly_truncated() -> None:
+    request = Mock(recv=Mock(side_effect=[b"ab", b""]))
+    with pytest.raises(ConnectionError):
+        log_catcher.recv_exactly(request, 4)
+
+
+def test_locked_writer() -> None:
+    target = io.StringIO()
+    writer = log_catcher.LockedWriter(target, buffer_size=8)
+    writer.write("abc\n")
+    assert target.getvalue() == ""
+    writer.write("defg\n")
+    assert target.getvalue() == "abc\ndefg\n"
+    writer.write("h\n")
+    writer.flush()
+    assert target.getvalue() == "abc\ndefg\nh\n"
+
+
+def test_locked_writer_delay() -> None:
+    target = io.StringIO()
+    writer = log_catcher.LockedWriter(target, max_delay=0.05)
+    writer.write("abc\n")
+    assert target.getvalue() == ""
+    time.sleep(0.25)
+    assert target.getvalue() == "abc\n"
+    assert writer.timer is None
+
+
+def test_locked_writer_unbuffered() -> None:
+    target = io.StringIO()
+    writer = log_catcher.LockedWriter(target, buffer_size=0)
+    writer.write("abc\n")
+    assert target.getvalue() == "abc\n"
+    assert writer.timer is None
+
+
+class InterruptedServer:
+    """Collects a line from a client that's still connected, then gets a Ctrl-C."""
+
+    def __init__(self, address: tuple[str, int], handler: type) -> None:
+        pass
+
+    def __enter__(self) -> "InterruptedServer":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+    def serve_forever(self) -> None:
+        log_catcher.LogDataCatcher.log_file.write('{"msg": "one"}\n')
+        raise KeyboardInterrupt
+
+
+@pytest.mark.parametrize("mode", ["thread", "fork"])
+def test_main_interrupted(monkeypatch, tmp_path, mode: str) -> None:
+    monkeypatch.setattr(log_catcher, "ThreadingLogServer", InterruptedServer)
+    monkeypatch.setattr(log_catcher, "ForkingLogServer", InterruptedServer)
+    target = tmp_path / "one.log"
+    with pytest.raises(KeyboardInterrupt):
+        log_catcher.main("localhost", 0, target, mode)
+    assert target.read_text() == '{"msg": "one"}\n'
+
+
+def frames(*payloads: object) -> list[bytes]:
+    """The chunks a client might send, splitting each frame in two."""
+    chunks = []
+    for payload in payloads:
+        frame = pickle.dumps(payload)
+        chunks.extend([struct.pack(">L", len(frame)), frame[:5], frame[5:]])
+    return chunks
+
+
+class MockRequest:
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.chunks = chunks
+
+    def recv(self, size: int) -> bytes:
+        # Never more than the rest of the current chunk: short reads.
+        if not self.chunks:
+            return b""
+        chunk = self.chunks[0][:size]
+        self.chunks[0] = self.chunks[0][size:]
+        if not self.chunks[0]:
+            self.chunks.pop(0)
+        return chunk
+
+
+@pytest.mark.parametrize("echo", [True, False])
+def test_log_data_catcher(monkeypatch, capsys, echo: bool) -> None:
+    target = io.StringIO()
+    monkeypatch.setattr(log_catcher.LogDataCatcher, "log_file", log_catcher.LockedWriter(target), raising=False)
+    monkeypatch.setattr(log_catcher.LogDataCatcher, "echo", echo)
+    monkeypatch.setattr(log_catcher.LogDataCatcher, "count", 0)
+    request = MockRequest(frames({"msg": "one"}, {"msg": "two"}))
+    log_catcher.LogDataCatcher(request, ("127.0.0.1", 12342), Mock())
+    assert [json.loads(line) for line in target.getvalue().splitlines()] == [
+        {"msg": "one"}, {"msg": "two"}
+    ]
+    out, err = capsys.readouterr()
+    assert (out != "") == echo
@@ -0,0 +1,164 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+How many records per second can the log catcher absorb?
+
+Many client processes, each with a ``logging.handlers.SocketHandler``,
+send numbered records to a catcher running in this process.
+The time each batch is written is recorded, so the latency of each record
+is the time from its creation in the client to its write in the catcher.
+The output file is then checked for dropped and corrupted records.
+
+The same load is run with pickled records from a plain ``SocketHandler``,
+which the catcher only accepts with ``--accept-pickle``, and with :mod:`log_wire` records from a ``WireSocketHandler``.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import logging.handlers
+from multiprocessing import Process
+from pathlib import Path
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+import log_catcher  # noqa: E402
+import log_wire  # noqa: E402
+
+HANDLERS: dict[str, type[logging.handlers.SocketHandler]] = {
+    "pickle": logging.handlers.SocketHandler,
+    "wire": log_wire.WireSocketHandler,
+}
+SERIALIZE_BATCH = log_catcher.serialize_batch
+
+
+def client(
+    host: str, port: int, client_id: int, records: int, wire_format: str
+) -> None:
+    handler = HANDLERS[wire_format](host, port)
+    logger = logging.getLogger(f"bench_{client_id}")
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    for sequence in range(records):
+        logger.info("client %d record %d", client_id, sequence)
+    handler.close()
+
+
+RECORD_PATTERN = re.compile(r"client (\d+) record (\d+)")
+
+
+def check(
+    target: Path, write_times: list[tuple[float, int]]
+) -> tuple[set[tuple[int, int]], int, list[float]]:
+    """The distinct (client, sequence) pairs, the corrupt line count, and the latencies."""
+    received: set[tuple[int, int]] = set()
+    corrupt = 0
+    latencies: list[float] = []
+    lines = iter(target.read_text().splitlines())
+    for written, count in write_times:
+        for line in (next(lines) for _ in range(count)):
+            try:
+                record = json.loads(line)
+                match = RECORD_PATTERN.fullmatch(record["msg"])
+            except (ValueError, KeyError, TypeError):
+                match = None
+            if match is None:
+                corrupt += 1
+                continue
+            received.add((int(match.group(1)), int(match.group(2))))
+            latencies.append(written - record["created"])
+    return received, corrupt, latencies
+
+
+async def load(
+    host: str, port: int, clients: int, records: int, target: Path, wire_format: str
+) -> None:
+    write_times: list[tuple[float, int]] = []
+    serialize_seconds = 0.0
+    log_catcher.LINE_COUNT = log_catcher.CORRUPT_FRAMES = 0
+
+    def timed_serialize_batch(payloads: list[bytes]) -> str:
+        nonlocal serialize_seconds
+        start = time.perf_counter()
+        text = SERIALIZE_BATCH(payloads)
+        serialize_seconds += time.perf_counter() - start
+        write_times.append((time.time(), len(payloads)))
+        return text
+
+    log_catcher.serialize_batch = timed_serialize_batch
+    # As if the catcher were run with --accept-pickle for the plain SocketHandler clients.
+    log_catcher.ACCEPT_PICKLE = log_catcher.get_options(
+        ["--accept-pickle"] if wire_format == "pickle" else []
+    ).accept_pickle
+    expected = clients * records
+
+    with target.open("w") as log_catcher.TARGET:
+        server = asyncio.create_task(log_catcher.main(host, port))
+        await asyncio.sleep(0.25)
+        start = time.perf_counter()
+        workers = [
+            Process(target=client, args=(host, port, c, records, wire_format))
+            for c in range(clients)
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            await asyncio.to_thread(w.join)
+        # Wait for the last records to arrive.
+        previous = -1
+        while log_catcher.LINE_COUNT != previous and log_catcher.LINE_COUNT < expected:
+            previous = log_catcher.LINE_COUNT
+            await asyncio.sleep(0.1)
+        server.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await server
+        elapsed = time.perf_counter() - start
+
+    received, corrupt, latencies = check(target, write_times)
+    print(f"{wire_format}: {clients} clients x {records} records = {expected} records")
+    print(f"records/sec     {len(received) / elapsed:,.0f}")
+    if latencies:
+        p50 = statistics.median(latencies)
+        p99 = statistics.quantiles(latencies, n=100)[-1] if len(latencies) > 1 else p50
+        print(f"latency p50     {1000 * p50:.3f}ms")
+        print(f"latency p99     {1000 * p99:.3f}ms")
+    if received:
+        print(f"decode+write    {1e6 * serialize_seconds / len(received):.2f}us/record")
+    print(f"dropped         {expected - len(received)}")
+    print(f"corrupt lines   {corrupt}")
+    print(f"corrupt frames  {log_catcher.CORRUPT_FRAMES}")
+    print(f"writer          {log_catcher.WRITER.metrics.as_dict()}")
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--records", type=int, default=2_000)
+    parser.add_argument("--port", type=int, default=18843)
+    parser.add_argument("--format", choices=["pickle", "wire", "both"], default="both")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = get_options()
+    formats = ["pickle", "wire"] if options.format == "both" else [options.format]
+    for wire_format in formats:
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(
+                load(
+                    "localhost",
+                    options.port,
+                    options.clients,
+                    options.records,
+                    Path(directory) / "one.log",
+                    wire_format,
+                )
+            )
@@ -0,0 +1,91 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+How long does a ``logger.info()`` call take in the application?
+
+Compare a socket handler attached directly to the logger with the
+queued, batching :class:`log_client.RemoteLogging` client,
+with a catcher that's up and one that's down.
+The catcher here is a thread that reads and discards bytes.
+"""
+import argparse
+import logging
+import logging.handlers
+from pathlib import Path
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from log_client import RemoteLogging  # noqa: E402
+from log_wire import WireSocketHandler  # noqa: E402
+
+
+def sink(listener: socket.socket) -> None:
+    while True:
+        try:
+            connection, _ = listener.accept()
+        except OSError:
+            return
+        with connection:
+            while connection.recv(1024 * 1024):
+                pass
+
+
+def timed_calls(handler: logging.Handler, records: int) -> list[float]:
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    latencies = []
+    for sequence in range(records):
+        start = time.perf_counter()
+        logger.info("record %d", sequence)
+        latencies.append(time.perf_counter() - start)
+    logger.removeHandler(handler)
+    return latencies
+
+
+def report(name: str, latencies: list[float], dropped: int | None) -> None:
+    """A plain SocketHandler drops records silently; there's no count."""
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[-1]
+    print(
+        f"{name:24s} p50 {1e6 * p50:7.2f}us  p99 {1e6 * p99:8.2f}us  "
+        f"max {1e6 * max(latencies):9.2f}us  dropped {'?' if dropped is None else dropped}"
+    )
+
+
+def main(records: int) -> None:
+    listener = socket.create_server(("localhost", 0))
+    up_port = listener.getsockname()[1]
+    threading.Thread(target=sink, args=(listener,), daemon=True).start()
+    with socket.create_server(("localhost", 0)) as unused:
+        down_port = unused.getsockname()[1]
+
+    for state, port in [("up", up_port), ("down", down_port)]:
+        direct = WireSocketHandler("localhost", port)
+        report(f"direct, catcher {state}", timed_calls(direct, records), None)
+        direct.close()
+
+        remote = RemoteLogging("localhost", port)
+        remote.start()
+        latencies = timed_calls(remote.handler, records)
+        remote.stop()
+        report(f"queued, catcher {state}", latencies, remote.dropped)
+    listener.close()
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20_000)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = get_options()
+    main(options.records)
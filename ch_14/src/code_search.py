@@ -4,12 +4,17 @@ Python 3 Object-Oriented Programming
 Chapter 14.  Concurrency
 """
 import argparse
-from collections.abc import Iterator
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
 from concurrent import futures
-from fnmatch import fnmatch
-import os
+import io
+import json
+import re
 import sys
 import time
+import tokenize
+
+from source_walker import SourceWalker
 
 
 import ast
@@ -48,39 +53,317 @@ def find_imports(path: Path) -> ImportResult:
     return ImportResult(path, iv.imports)
 
 
+# Anything that might start an import statement: at the start of a line,
+# after a ; or after the : of a one-line compound statement.
+# False positives are harmless, they only cause a fallback to the ast engine.
+POSSIBLE_IMPORT = re.compile(r"(?:^|[;:])[ \t]*(?:import|from)\b", re.MULTILINE)
+
+
+def statement_imports(statement: list[tokenize.TokenInfo]) -> set[str] | None:
+    """
+    The modules named by one top-level ``import`` or ``from`` statement,
+    or None if the statement is more than the simple cases handled here.
+    """
+    words = [t.string for t in statement if t.type not in {tokenize.NL, tokenize.COMMENT}]
+    if ";" in words:
+        return None
+    match words:
+        case ["import", *names]:
+            modules: set[str] = set()
+            dotted: list[str] = []
+            alias = False
+            for word in names + [","]:
+                if word == ",":
+                    modules.add("".join(dotted))
+                    dotted, alias = [], False
+                elif word == "as":
+                    alias = True
+                elif not alias:
+                    dotted.append(word)
+            return modules
+        case ["from", *names] if "import" in names:
+            module = "".join(names[: names.index("import")]).lstrip(".")
+            return {module} if module else set()
+        case _:
+            return None
+
+
+def fast_imports(source: str) -> set[str] | None:
+    """
+    Tokenize only the leading block of docstrings, comments, and imports.
+
+    If anything after that block could be an import -- an import inside a function,
+    an ``if TYPE_CHECKING:`` block, or a try/except import --
+    the answer is None, and the full ``ast`` parse is required.
+
+    >>> sorted(fast_imports("'Doc'\\nimport os.path as osp, sys\\nfrom . import a\\nfrom .b.c import d\\nx = 1\\n"))
+    ['b.c', 'os.path', 'sys']
+    >>> fast_imports("import os\\ndef f():\\n    import sys\\n") is None
+    True
+    """
+    imports: set[str] = set()
+    statement: list[tokenize.TokenInfo] = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type in {tokenize.ENCODING, tokenize.COMMENT, tokenize.NL}:
+                if statement:
+                    statement.append(token)
+                continue
+            if token.type in {tokenize.NEWLINE, tokenize.ENDMARKER}:
+                if statement and statement[0].type != tokenize.STRING:
+                    if (names := statement_imports(statement)) is None:
+                        return None
+                    imports |= names
+                statement = []
+                if token.type == tokenize.ENDMARKER:
+                    return imports
+                continue
+            if not statement and not (
+                token.type == tokenize.STRING
+                or token.type == tokenize.NAME and token.string in {"import", "from"}
+            ):
+                # The end of the import block.
+                rest = source.splitlines(keepends=True)[token.start[0] - 1 :]
+                if POSSIBLE_IMPORT.search("".join(rest)):
+                    return None
+                return imports
+            if statement and statement[0].type == tokenize.STRING and token.type != tokenize.STRING:
+                # Not a docstring after all.
+                return None
+            statement.append(token)
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    return imports
+
+
+def analyze(path: Path, engine: str = "fast") -> tuple[ImportResult, str]:
+    """Find the imports, returning the name of the engine that was used."""
+    source = path.read_text()
+    if engine == "fast" and (imports := fast_imports(source)) is not None:
+        return ImportResult(path, imports), "fast"
+    iv = ImportVisitor()
+    iv.visit(ast.parse(source))
+    return ImportResult(path, iv.imports), "ast"
+
+
+type Signature = tuple[int, int]
+
+
+class ImportCache:
+    """
+    Persistent ImportResult cache, keyed by path, with the file's
+    modification time and size as the signature.
+    A file with an unchanged signature isn't parsed again.
+
+    The cache is a JSON document; a missing or unreadable file means an empty cache.
+    With no ``cache_path``, the cache only lives in memory.
+    """
+
+    def __init__(self, cache_path: Path | None = None) -> None:
+        self.cache_path = cache_path
+        self.entries: dict[str, tuple[int, int, list[str]]] = {}
+        self.signatures: dict[str, Signature] = {}
+        self.hits = 0
+        self.misses = 0
+        if cache_path is not None and cache_path.exists():
+            try:
+                document = json.loads(cache_path.read_text())
+                self.entries = {
+                    name: (mtime, size, imports)
+                    for name, (mtime, size, imports) in document.items()
+                }
+            except (ValueError, TypeError, AttributeError):
+                self.entries = {}
+
+    @staticmethod
+    def signature(path: Path) -> Signature:
+        status = path.stat()
+        return status.st_mtime_ns, status.st_size
+
+    def get(self, path: Path) -> ImportResult | None:
+        signature = self.signature(path)
+        match self.entries.get(str(path)):
+            case (mtime, size, imports) if (mtime, size) == signature:
+                self.hits += 1
+                return ImportResult(path, set(imports))
+            case _:
+                self.misses += 1
+                self.signatures[str(path)] = signature
+                return None
+
+    def put(self, result: ImportResult) -> None:
+        name = str(result.path)
+        if name in self.signatures:
+            mtime, size = self.signatures.pop(name)
+        else:
+            mtime, size = self.signature(result.path)
+        self.entries[name] = (mtime, size, sorted(result.imports))
+
+    def save(self) -> None:
+        if self.cache_path is not None:
+            self.cache_path.write_text(json.dumps(self.entries))
+
+
+class ImportGraph:
+    """
+    File-to-module import edges, kept in both directions so that
+    "which files transitively import X" is a short graph walk.
+
+    Module names are interned as small integers; the edges are sets of those integers.
+    A file is known by its dotted module name relative to ``base``
+    and by each shorter suffix of that name,
+    since ``src/dice.py`` is imported as ``dice``.
+    Importing ``a.b.c`` also imports ``a`` and ``a.b``; a package importing itself is ignored.
+
+    Results can be added in any order, and adding a file again replaces its edges.
+
+    >>> graph = ImportGraph(Path("/app"))
+    >>> graph.add(ImportResult(Path("/app/src/dice.py"), {"random"}))
+    >>> graph.add(ImportResult(Path("/app/src/server.py"), {"dice", "os.path"}))
+    >>> graph.add(ImportResult(Path("/app/client.py"), {"src.server"}))
+    >>> sorted(p.name for p in graph.importers("random"))
+    ['client.py', 'dice.py', 'server.py']
+    >>> sorted(p.name for p in graph.importers("os"))
+    ['client.py', 'server.py']
+    >>> graph.add(ImportResult(Path("/app/src/server.py"), {"os"}))
+    >>> sorted(p.name for p in graph.importers("random"))
+    ['dice.py']
+    """
+
+    def __init__(self, base: Path) -> None:
+        self.base = base
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.paths: dict[int, Path] = {}
+        self.aliases: dict[int, tuple[int, ...]] = {}
+        self.forward: dict[int, frozenset[int]] = {}
+        self.reverse: defaultdict[int, set[int]] = defaultdict(set)
+        self._importers: dict[int, frozenset[int]] = {}
+
+    def intern(self, name: str) -> int:
+        if (node := self.ids.get(name)) is None:
+            node = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return node
+
+    def file_node(self, path: Path) -> int:
+        parts = path.relative_to(self.base).with_suffix("").parts
+        if parts and parts[-1] == "__init__":
+            parts = parts[:-1]
+        node = self.intern(".".join(parts))
+        if node not in self.paths:
+            self.paths[node] = path
+            self.aliases[node] = tuple(
+                self.intern(".".join(parts[i:])) for i in range(len(parts))
+            )
+        return node
+
+    def add(self, result: ImportResult) -> None:
+        file = self.file_node(result.path)
+        modules = frozenset(
+            self.intern(".".join(parts[: i + 1]))
+            for parts in (name.split(".") for name in result.imports)
+            for i in range(len(parts))
+        ).difference(self.aliases[file])
+        previous = self.forward.get(file, frozenset())
+        for module in previous - modules:
+            self.reverse[module].discard(file)
+        for module in modules - previous:
+            self.reverse[module].add(file)
+        self.forward[file] = modules
+        if modules != previous:
+            self._importers.clear()
+
+    def extend(self, results: Iterable[ImportResult]) -> None:
+        for result in results:
+            self.add(result)
+
+    def remove(self, path: Path) -> None:
+        self.add(ImportResult(path, set()))
+
+    def importers(self, module: str) -> set[Path]:
+        """All of the files that import ``module``, directly or indirectly."""
+        if (start := self.ids.get(module)) is None:
+            return set()
+        if (found := self._importers.get(start)) is None:
+            seen: set[int] = set()
+            frontier = [start]
+            while frontier:
+                for file in self.reverse.get(frontier.pop(), ()):
+                    if file not in seen:
+                        seen.add(file)
+                        frontier.extend(self.aliases[file])
+            found = self._importers[start] = frozenset(seen)
+        return {self.paths[file] for file in found}
+
+
 def all_source(path: Path, pattern: str) -> Iterator[Path]:
-    for root, dirs, files in os.walk(path):
-        for skip in {".tox", ".mypy_cache", "__pycache__", ".idea"}:
-            if skip in dirs:
-                dirs.remove(skip)
-        yield from (Path(root) / f for f in files if fnmatch(f, pattern))
+    yield from SourceWalker([pattern]).walk(path)
 
 
 def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("path", type=Path, nargs="*")
+    parser.add_argument(
+        "--cache", type=Path, default=Path(".code_search_cache.json")
+    )
+    parser.add_argument("--engine", choices=["fast", "ast"], default="fast")
+    parser.add_argument("--no-cache", dest="cache", action="store_const", const=None)
+    parser.add_argument("--who-imports", action="append", default=[])
     return parser.parse_args(argv)
 
 
-def main(base: Path = Path.cwd()) -> None:
+def main(
+    base: Path = Path.cwd(), cache: ImportCache | None = None, engine: str = "fast"
+) -> ImportGraph:
     print(f"\n{base}")
+    if cache is None:
+        cache = ImportCache()
+    graph = ImportGraph(base)
     start = time.perf_counter()
-    with futures.ThreadPoolExecutor(24) as pool:
-        analyzers = [
-            pool.submit(find_imports, path) for path in all_source(base, "*.py")
-        ]
-        analyzed = (worker.result() for worker in futures.as_completed(analyzers))
+    analyzed: list[ImportResult] = []
+    changed: list[Path] = []
+    engines = {"cache": 0, "fast": 0, "ast": 0}
+    for path in all_source(base, "*.py"):
+        if (result := cache.get(path)) is None:
+            changed.append(path)
+        else:
+            analyzed.append(result)
+            graph.add(result)
+            engines["cache"] += 1
+    if changed:
+        # Parsing is CPU-bound: use processes, not threads.
+        with futures.ProcessPoolExecutor() as pool:
+            analyzers = [pool.submit(analyze, path, engine) for path in changed]
+            for worker in futures.as_completed(analyzers):
+                result, used = worker.result()
+                cache.put(result)
+                analyzed.append(result)
+                graph.add(result)
+                engines[used] += 1
+    cache.save()
     for example in sorted(analyzed):
         print(
             f"{'->' if example.focus else '':2s} "
             f"{example.path.relative_to(base)} {example.imports}"
         )
     end = time.perf_counter()
-    rate = 1000 * (end - start) / len(analyzers)
-    print(f"Searched {len(analyzers)} files in {base} at {rate:.3f}ms/file")
+    rate = 1000 * (end - start) / len(analyzed)
+    used = ", ".join(f"{name} {count}" for name, count in engines.items())
+    print(f"Searched {len(analyzed)} files in {base} at {rate:.3f}ms/file ({used})")
+    print(f"Cache {cache.hits} hits, {cache.misses} misses")
+    return graph
 
 
 if __name__ == "__main__":
     options = get_options()
+    cache = ImportCache(options.cache)
     for path in options.path:
-        main(path)
+        graph = main(path, cache, options.engine)
+        for module in options.who_imports:
+            start = time.perf_counter()
+            importers = graph.importers(module)
+            microseconds = 1_000_000 * (time.perf_counter() - start)
+            print(f"{len(importers)} files import {module!r} ({microseconds:.1f}μs)")
+            for importer in sorted(importers):
+                print(f"   {importer.relative_to(path)}")
@@ -3,16 +3,108 @@ Python 3 Object-Oriented Programming
 
 Chapter 14.  Concurrency
 """
-from collections.abc import Iterator
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+import heapq
 from pathlib import Path
-from multiprocessing import Queue
+from multiprocessing import Queue, synchronize
+import time
+from typing import NamedTuple
+
+
+class WorkerReport(NamedTuple):
+    """A worker's end-of-query marker, with its load and the time the query took."""
+    pid: int
+    lines: int
+    matches: int
+    seconds: float
 
 
 type Query_Q = Queue[str | None]
-type Result_Q = Queue[list[str]]
+type Result_Q = Queue[list[str] | WorkerReport]
+
+# Matches are sent back in batches of at most BATCH_SIZE lines.
+# At most RESULTS_MAXSIZE batches can be waiting in the results queue;
+# a worker that gets ahead of the consumer blocks until there's room.
+BATCH_SIZE = 256
+RESULTS_MAXSIZE = 64
+
+
+class TrigramIndex:
+    """
+    An inverted index from each three-character substring to the
+    numbers of the lines that contain it.
+
+    Any line containing the query must contain every trigram of the query,
+    so intersecting the posting lists gives a (usually small) set of candidate
+    lines. Each candidate is still checked with ``in``.
+    Queries shorter than a trigram fall back to a scan of all lines.
+
+    >>> index = TrigramIndex(["import os", "class Spam:", "def spam():"])
+    >>> index.search("spam")
+    ['def spam():']
+    >>> index.search("s")
+    ['import os', 'class Spam:', 'def spam():']
+    >>> index.search("eggs")
+    []
+    """
+
+    size = 3
+
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+        postings: defaultdict[str, list[int]] = defaultdict(list)
+        for number, line in enumerate(lines):
+            for trigram in self.trigrams(line):
+                postings[trigram].append(number)
+        self.postings = dict(postings)
+
+    @classmethod
+    def trigrams(cls, text: str) -> set[str]:
+        return {text[i : i + cls.size] for i in range(len(text) - cls.size + 1)}
+
+    def candidates(self, query_text: str) -> list[int]:
+        posting_lists = sorted(
+            (self.postings.get(t, []) for t in self.trigrams(query_text)), key=len
+        )
+        if not posting_lists[0]:
+            return []
+        found = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            found.intersection_update(posting)
+            if not found:
+                break
+        return sorted(found)
+
+    def matches(self, query_text: str) -> Iterator[str]:
+        if len(query_text) < self.size:
+            yield from (line for line in self.lines if query_text in line)
+        else:
+            yield from (
+                line
+                for line in (self.lines[n] for n in self.candidates(query_text))
+                if query_text in line
+            )
 
+    def search(self, query_text: str) -> list[str]:
+        return list(self.matches(query_text))
 
-def search(paths: list[Path], query_q: Query_Q, results_q: Result_Q) -> None:
+
+def search(
+    paths: list[Path],
+    query_q: Query_Q,
+    results_q: Result_Q,
+    cancel: synchronize.Event | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> None:
+    """
+    Load the lines from the given paths, then answer queries until a None query arrives.
+
+    Matches for each query are put on ``results_q`` as a sequence of lists
+    of at most ``batch_size`` lines, followed by a WorkerReport to mark the end.
+    If ``cancel`` is set, the worker stops looking for matches to the current query,
+    and drops the batch it hasn't sent.
+    """
     print(f"PID: {os.getpid()}, paths {len(paths)}")
     lines: list[str] = []
     for path in paths:
@@ -20,33 +112,86 @@ def search(paths: list[Path], query_q: Query_Q, results_q: Result_Q) -> None:
             line.rstrip()
             for line in path.read_text().splitlines()
         )
+    index = TrigramIndex(lines)
 
     while True:
         if (query_text := query_q.get()) is None:
             break
-        results = [line for line in lines if query_text in line]
-        results_q.put(results)
+        start = time.perf_counter()
+        count = 0
+        batch: list[str] = []
+        for line in index.matches(query_text):
+            # Checked for each match, so a query with sparse matches stops promptly, too.
+            if cancel is not None and cancel.is_set():
+                batch = []
+                break
+            count += 1
+            batch.append(line)
+            if len(batch) == batch_size:
+                results_q.put(batch)
+                batch = []
+        if batch:
+            results_q.put(batch)
+        results_q.put(
+            WorkerReport(os.getpid(), len(lines), count, time.perf_counter() - start)
+        )
+
+
+def file_size(path: Path) -> int:
+    return path.stat().st_size
+
+
+def plan_shards(
+    paths: list[Path], workers: int, size: Callable[[Path], int] = file_size
+) -> list[list[Path]]:
+    """
+    Greedy largest-first assignment: each path, biggest first,
+    goes to the worker with the smallest total so far.
+
+    >>> sizes = {"a": 7, "b": 5, "c": 4, "d": 3, "e": 1}
+    >>> shards = plan_shards([Path(n) for n in sizes], 2, lambda p: sizes[p.name])
+    >>> [[p.name for p in shard] for shard in shards]
+    [['a', 'd'], ['b', 'c', 'e']]
+    """
+    shards: list[list[Path]] = [[] for _ in range(workers)]
+    loads = [(0, w) for w in range(workers)]
+    for path in sorted(paths, key=size, reverse=True):
+        load, w = heapq.heappop(loads)
+        shards[w].append(path)
+        heapq.heappush(loads, (load + size(path), w))
+    return shards
 
 
-from fnmatch import fnmatch
 import os
 
+from source_walker import SourceWalker
+
 
 class DirectorySearch:
     def __init__(self) -> None:
         self.query_queues: list[Query_Q]
         self.results_queue: Result_Q
         self.search_workers: list[Process]
+        self.cancel: synchronize.Event
+        self.shard_bytes: list[int]
+        self.reports: list[WorkerReport] = []
 
-    def setup_search(self, paths: list[Path], cpus: int | None = None) -> None:
+    def setup_search(
+        self,
+        paths: list[Path],
+        cpus: int | None = None,
+        size: Callable[[Path], int] = file_size,
+    ) -> None:
         if cpus is None:
             cpus = cpu_count()
-        worker_paths = [paths[i::cpus] for i in range(cpus)]
+        worker_paths = plan_shards(paths, cpus, size)
+        self.shard_bytes = [sum(map(size, shard)) for shard in worker_paths]
         self.query_queues = [Queue() for p in range(cpus)]
-        self.results_queue = Queue()
+        self.results_queue = Queue(maxsize=RESULTS_MAXSIZE)
+        self.cancel = Event()
 
         self.search_workers = [
-            Process(target=search, args=(paths, q, self.results_queue))
+            Process(target=search, args=(paths, q, self.results_queue, self.cancel))
             for paths, q in zip(worker_paths, self.query_queues)
         ]
         for proc in self.search_workers:
@@ -60,22 +205,37 @@ class DirectorySearch:
         for proc in self.search_workers:
             proc.join()
 
-    def search(self, target: str) -> Iterator[str]:
+    def search(self, target: str, limit: int | None = None) -> Iterator[str]:
         # print(f"search queues={self.query_queues}")
+        self.cancel.clear()
+        self.reports = []
         for q in self.query_queues:
             q.put(target)
 
-        for i in range(len(self.query_queues)):
-            for match in self.results_queue.get():
-                yield match
+        running = len(self.query_queues)
+        count = 0
+        try:
+            while running and (limit is None or count < limit):
+                if isinstance(batch := self.results_queue.get(), WorkerReport):
+                    self.reports.append(batch)
+                    running -= 1
+                    continue
+                if limit is not None:
+                    batch = batch[: limit - count]
+                count += len(batch)
+                yield from batch
+        finally:
+            # Stopped early? Tell the workers, then drain to each end-of-query marker.
+            if running:
+                self.cancel.set()
+            while running:
+                if isinstance(batch := self.results_queue.get(), WorkerReport):
+                    self.reports.append(batch)
+                    running -= 1
 
 
 def all_source(path: Path, pattern: str) -> Iterator[Path]:
-    for root, dirs, files in os.walk(path):
-        for skip in {".tox", ".mypy_cache", "__pycache__", ".idea", ".venv"}:
-            if skip in dirs:
-                dirs.remove(skip)
-        yield from (Path(root) / f for f in files if fnmatch(f, pattern))
+    yield from SourceWalker([pattern]).walk(path)
 
 
 # VERY SLOW
@@ -88,23 +248,39 @@ def all_source(path: Path, pattern: str) -> Iterator[Path]:
 #         yield code_path.absolute()
 
 
-from multiprocessing import Process, Queue, cpu_count
-import time
+from multiprocessing import Event, Process, Queue, cpu_count
 
 if __name__ == "__main__":
     ds = DirectorySearch()
     base = Path.cwd().parent
-    all_paths = list(all_source(base, "*.py"))
-    ds.setup_search(all_paths)
+    walker = SourceWalker(["*.py"])
+    sizes = dict(walker.sized(base))
+    all_paths = list(sizes)
+    print(
+        f"Walked {walker.files} files in {1000 * walker.seconds:.3f}ms "
+        f"({walker.rate:,.0f} files/s)"
+    )
+    ds.setup_search(all_paths, size=sizes.__getitem__)
+    print(f"Shard bytes {ds.shard_bytes}")
     for target in ("import", "class", "def"):
         start = time.perf_counter()
+        first = None
         count = 0
         for line in ds.search(target):
             # print(line)  # If you want to see what's going on
+            if first is None:
+                first = time.perf_counter()
             count += 1
-        milliseconds = 1000 * (time.perf_counter() - start)
+        end = time.perf_counter()
+        milliseconds = 1000 * (end - start)
+        first_ms = 1000 * ((first or end) - start)
         print(
             f"Found {count} {target!r} in {len(all_paths)} files "
-            f"in {milliseconds:.3f}ms"
+            f"in {milliseconds:.3f}ms (first match {first_ms:.3f}ms)"
         )
+        for report in sorted(ds.reports):
+            print(
+                f"    PID {report.pid}: {report.lines} lines, "
+                f"{report.matches} matches, {1000 * report.seconds:.3f}ms"
+            )
     ds.teardown_search()
@@ -3,19 +3,30 @@ Python 3 Object-Oriented Programming
 
 Chapter 14.  Concurrency
 """
+import argparse
 import asyncio
 import asyncio.exceptions
+from collections import Counter, deque
 import json
 from pathlib import Path
 import pickle
 import struct
-from typing import TextIO
+import sys
+from typing import TextIO, cast
 
+import log_wire
+from log_rotation import RotatingLog
 
 
-
-TARGET: TextIO
+TARGET: TextIO | RotatingLog
 LINE_COUNT = 0
+CORRUPT_FRAMES = 0
+REJECTED_FRAMES = 0
+# Frames that passed accept() but couldn't be decoded; only the writer thread counts these.
+UNDECODABLE_FRAMES = 0
+# Pickled frames from a plain SocketHandler. Unpickling data from the network
+# can run arbitrary code, so only log_wire frames are accepted without --accept-pickle.
+ACCEPT_PICKLE = False
 
 
 def serialize(bytes_payload: bytes) -> str:
@@ -25,38 +36,276 @@ def serialize(bytes_payload: bytes) -> str:
     TARGET.write("\n")
     return text_message
 
+
+def json_line(bytes_payload: bytes) -> str:
+    if log_wire.is_wire(bytes_payload):
+        return log_wire.to_json(bytes_payload)
+    return json.dumps(pickle.loads(bytes_payload)) + "\n"
+
+
+def accept(bytes_payload: bytes) -> bool:
+    """
+    Check a frame before it's queued for the writer.
+    A malformed wire frame is corrupt; a pickle is rejected unless ACCEPT_PICKLE is set.
+    """
+    global CORRUPT_FRAMES, REJECTED_FRAMES
+    if log_wire.is_wire(bytes_payload):
+        if log_wire.check(bytes_payload):
+            return True
+        CORRUPT_FRAMES += 1
+        return False
+    if ACCEPT_PICKLE:
+        return True
+    REJECTED_FRAMES += 1
+    return False
+
+
+def serialize_batch(payloads: list[bytes]) -> str:
+    """
+    One write for the whole batch.
+    A frame that can't be decoded is counted and skipped; the rest of the batch is written.
+    """
+    global UNDECODABLE_FRAMES
+    lines = []
+    for bytes_payload in payloads:
+        try:
+            lines.append(json_line(bytes_payload))
+        except Exception:
+            UNDECODABLE_FRAMES += 1
+    text = "".join(lines)
+    TARGET.write(text)
+    TARGET.flush()
+    return text
+
+
+class WriterMetrics:
+    def __init__(self) -> None:
+        self.records = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.max_depth = 0
+        self.batch_sizes: Counter[int] = Counter()
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "records": self.records,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "max_queue_depth": self.max_depth,
+            "mean_batch_size": self.records / self.batches if self.batches else 0.0,
+            "largest_batch": max(self.batch_sizes, default=0),
+        }
+
+
+class BatchWriter:
+    """
+    A single writer task, fed by a bounded queue.
+
+    Records are coalesced into a batch until there are ``batch_size`` of them,
+    or ``batch_seconds`` have passed since the first one arrived.
+    A batch is serialized with one trip to a worker thread, and written with one write.
+    When the queue is full, :meth:`put` waits; this slows down the clients.
+    """
+
+    def __init__(
+        self, maxsize: int = 10_000, batch_size: int = 1_000, batch_seconds: float = 0.050
+    ) -> None:
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.metrics = WriterMetrics()
+        self.task: asyncio.Task[None] | None = None
+
+    async def put(self, bytes_payload: bytes) -> None:
+        await self.queue.put(bytes_payload)
+        self.metrics.max_depth = max(self.metrics.max_depth, self.queue.qsize())
+
+    def put_nowait(self, bytes_payload: bytes) -> bool:
+        """Queue a payload if there's room, returning False if the queue is full."""
+        try:
+            self.queue.put_nowait(bytes_payload)
+        except asyncio.QueueFull:
+            return False
+        self.metrics.max_depth = max(self.metrics.max_depth, self.queue.qsize())
+        return True
+
+    async def next_batch(self) -> list[bytes]:
+        batch = [await self.queue.get()]
+        try:
+            async with asyncio.timeout(self.batch_seconds):
+                while len(batch) < self.batch_size:
+                    batch.append(await self.queue.get())
+        except TimeoutError:
+            pass
+        return batch
+
+    async def run(self) -> None:
+        """Nothing in a batch stops the writer; otherwise, every client would wait forever."""
+        while True:
+            batch = await self.next_batch()
+            try:
+                await asyncio.to_thread(serialize_batch, batch)
+            except Exception as ex:
+                self.metrics.failed_batches += 1
+                print(f"Batch of {len(batch)} not written: {ex!r}", file=sys.stderr)
+            finally:
+                self.metrics.records += len(batch)
+                self.metrics.batches += 1
+                self.metrics.batch_sizes[len(batch)] += 1
+                for _ in batch:
+                    self.queue.task_done()
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        """Write everything that's been queued, then stop the writer task."""
+        if self.task is not None:
+            await self.queue.join()
+            self.task.cancel()
+            self.task = None
+
+
+WRITER: BatchWriter
+
+
 async def log_writer(bytes_payload: bytes) -> None:
     global LINE_COUNT
     LINE_COUNT += 1
-    await asyncio.to_thread(serialize, bytes_payload)
+    await WRITER.put(bytes_payload)
 
 
 SIZE_FORMAT = ">L"
 SIZE_BYTES = struct.calcsize(SIZE_FORMAT)
 
 
+# Anything bigger than this isn't a log record; the stream is out of step.
+MAX_FRAME = 16 * 1024 * 1024
+
+
 async def log_catcher(
     reader: asyncio.StreamReader, writer: asyncio.StreamWriter
 ) -> None:
+    """
+    The streams version of the catcher.
+    A ``read(n)`` can return fewer than ``n`` bytes; ``readexactly(n)`` can't.
+    """
+    global CORRUPT_FRAMES
     count = 0
     client_socket = writer.get_extra_info("socket")
-    size_header = await reader.read(SIZE_BYTES)
-    while size_header:
-        payload_size = struct.unpack(SIZE_FORMAT, size_header)
-        bytes_payload = await reader.read(payload_size[0])
-        await log_writer(bytes_payload)
-        count += 1
-        size_header = await reader.read(SIZE_BYTES)
+    try:
+        while True:
+            size_header = await reader.readexactly(SIZE_BYTES)
+            payload_size = struct.unpack(SIZE_FORMAT, size_header)
+            bytes_payload = await reader.readexactly(payload_size[0])
+            if accept(bytes_payload):
+                await log_writer(bytes_payload)
+            count += 1
+    except asyncio.IncompleteReadError as ex:
+        if ex.partial:
+            CORRUPT_FRAMES += 1
     print(f"From {client_socket.getpeername()}: {count} lines")
 
 
+class LogCatcherProtocol(asyncio.BufferedProtocol):
+    """
+    The protocol version of the catcher.
+
+    The event loop receives bytes directly into one reusable buffer per connection;
+    there's no intermediate ``bytes`` object for each read.
+    Complete frames are sliced out of the buffer and handed to the writer.
+    A partial frame stays in the buffer until the rest of it arrives.
+
+    When the writer's queue is full, reading from this client is paused
+    until the backlog has been queued.
+    """
+
+    def __init__(self, buffer_size: int = 256 * 1024) -> None:
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not yet consumed
+        self.end = 0  # First byte not yet received
+        self.count = 0
+        self.backlog: deque[bytes] = deque()
+        self.drainer: asyncio.Task[None] | None = None
+        self.transport: asyncio.Transport
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.Transport, transport)
+        self.peer = transport.get_extra_info("peername")
+
+    def resize(self, size: int) -> None:
+        """Move the unconsumed bytes to the front of a buffer of the given size."""
+        pending = self.end - self.start
+        if size == len(self.buffer):
+            self.view[:pending] = self.view[self.start : self.end]
+        else:
+            buffer = bytearray(size)
+            buffer[:pending] = self.view[self.start : self.end]
+            self.view.release()
+            self.buffer, self.view = buffer, memoryview(buffer)
+        self.start, self.end = 0, pending
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self.end == len(self.buffer):
+            self.resize(len(self.buffer) * (2 if self.start == 0 else 1))
+        return self.view[self.end :]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        global CORRUPT_FRAMES
+        self.end += nbytes
+        while self.end - self.start >= SIZE_BYTES:
+            (size,) = struct.unpack_from(SIZE_FORMAT, self.buffer, self.start)
+            if size > MAX_FRAME:
+                CORRUPT_FRAMES += 1
+                self.transport.close()
+                return
+            frame_end = self.start + SIZE_BYTES + size
+            if frame_end > self.end:
+                if SIZE_BYTES + size > len(self.buffer):
+                    self.resize(SIZE_BYTES + size)
+                break
+            self.frame_received(bytes(self.view[self.start + SIZE_BYTES : frame_end]))
+            self.start = frame_end
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def frame_received(self, bytes_payload: bytes) -> None:
+        global LINE_COUNT
+        if not accept(bytes_payload):
+            return
+        LINE_COUNT += 1
+        self.count += 1
+        if self.backlog or not WRITER.put_nowait(bytes_payload):
+            self.backlog.append(bytes_payload)
+            if self.drainer is None:
+                self.transport.pause_reading()
+                self.drainer = asyncio.get_running_loop().create_task(self.drain())
+
+    async def drain(self) -> None:
+        while self.backlog:
+            await WRITER.put(self.backlog.popleft())
+        self.drainer = None
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        global CORRUPT_FRAMES
+        if self.start != self.end:
+            CORRUPT_FRAMES += 1
+        print(f"From {self.peer}: {self.count} lines")
+
+
 server: asyncio.AbstractServer
 
 
 async def main(host: str, port: int) -> None:
-    global server
-    server = await asyncio.start_server(
-        log_catcher,
+    global server, WRITER
+    WRITER = BatchWriter()
+    WRITER.start()
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(
+        LogCatcherProtocol,
         host=host,
         port=port,
     )
@@ -67,20 +316,59 @@ async def main(host: str, port: int) -> None:
     else:
         raise ValueError("Failed to create server")
 
-    async with server:
-        await server.serve_forever()
-    server.close_clients()
+    try:
+        async with server:
+            await server.serve_forever()
+        server.close_clients()
+    finally:
+        await WRITER.close()
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=18842)
+    parser.add_argument("--output", type=Path, default=Path("one.log"))
+    parser.add_argument(
+        "--accept-pickle",
+        action="store_true",
+        help="from a plain SocketHandler; trusted clients only",
+    )
+    rotation = parser.add_argument_group("rotation")
+    rotation.add_argument("--max-bytes", type=int)
+    rotation.add_argument("--max-seconds", type=float)
+    rotation.add_argument("--compress", action="store_true")
+    rotation.add_argument("--keep", type=int)
+    return parser.parse_args(argv)
+
+
+def open_target(options: argparse.Namespace) -> TextIO | RotatingLog:
+    """A plain file, unless one of the rotation limits is set."""
+    if options.max_bytes is None and options.max_seconds is None:
+        return cast(TextIO, options.output.open("w"))
+    return RotatingLog(
+        options.output,
+        max_bytes=options.max_bytes,
+        max_seconds=options.max_seconds,
+        compress=options.compress,
+        keep=options.keep,
+    )
 
 
 if __name__ == "__main__":
-    # These often have command-line or environment overrides
-    HOST, PORT = "localhost", 18842
+    HOST = "localhost"
+    options = get_options()
+    ACCEPT_PICKLE = options.accept_pickle
 
-    with Path("one.log").open("w") as TARGET:
+    with open_target(options) as TARGET:
         try:
-            asyncio.run(main(HOST, PORT))
+            asyncio.run(main(HOST, options.port))
 
         except (asyncio.exceptions.CancelledError, KeyboardInterrupt):
-            ending = {"lines_collected": LINE_COUNT}
-            print(ending)
+            ending = {
+                "lines_collected": LINE_COUNT,
+                "corrupt_frames": CORRUPT_FRAMES,
+                "rejected_frames": REJECTED_FRAMES,
+                "undecodable_frames": UNDECODABLE_FRAMES,
+            }
+            print(ending, WRITER.metrics.as_dict())
             TARGET.write(json.dumps(ending) + "\n")
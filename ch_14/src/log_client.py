@@ -0,0 +1,166 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+A remote logging client that doesn't block the application.
+
+The application's loggers put records on a bounded queue, which takes microseconds.
+A listener thread takes records off the queue, and sends them to the catcher
+in batches: one ``sendall()`` when a batch is full, or when the queue runs dry.
+When the catcher is down, :class:`logging.handlers.SocketHandler` reconnects with an
+exponential backoff; meanwhile, batches that can't be sent are dropped and counted,
+and once the queue fills up, new records are dropped and counted, too.
+"""
+import copy
+import logging
+import logging.handlers
+import queue
+from typing import Any, cast
+
+from log_wire import WireSocketHandler
+
+FORMATTER = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A :class:`logging.handlers.QueueHandler` that never waits for room in the queue.
+
+    The queued records keep their own fields, the way ``SocketHandler`` sends them:
+    the message merged with its args, and any traceback in ``exc_text``.
+    The base class would put the whole formatted line, traceback and all, in ``msg``.
+    """
+
+    def __init__(self, record_queue: queue.Queue[Any]) -> None:
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = (self.formatter or FORMATTER).formatException(record.exc_info)
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingSocketHandler(WireSocketHandler):
+    """
+    Collect frames, and send a batch of them with one ``sendall()``.
+
+    :meth:`flush` sends what's been collected; the listener calls it when the queue is empty.
+    If there's no connection to the catcher, and it's too soon to try another,
+    or the send fails, the batch is dropped.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        batch_size: int = 256,
+        retry_start: float = 0.5,
+        retry_max: float = 30.0,
+    ) -> None:
+        super().__init__(host, port)
+        self.batch_size = batch_size
+        self.retryStart = retry_start
+        self.retryMax = retry_max
+        self.batch: list[bytes] = []
+        self.sent = 0
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.batch.append(self.makePickle(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:  # type: ignore[union-attr]
+            if not self.batch:
+                return
+            batch, self.batch = self.batch, []
+            self.send(b"".join(batch))
+            if self.sock is None:
+                self.dropped += len(batch)
+            else:
+                self.sent += len(batch)
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    A :class:`logging.handlers.QueueListener` that flushes its handlers
+    whenever it's about to wait for the next record.
+    """
+
+    def __init__(
+        self, record_queue: queue.Queue[Any], *handlers: logging.Handler
+    ) -> None:
+        super().__init__(record_queue, *handlers)
+        self.records = record_queue
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        try:
+            return cast(logging.LogRecord, self.records.get_nowait())
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+        return cast(logging.LogRecord, self.records.get(block))
+
+    def enqueue_sentinel(self) -> None:
+        # The queue may be full; the listener is still emptying it.
+        # None is the QueueListener sentinel.
+        self.records.put(None)
+
+    def stop(self) -> None:
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+class RemoteLogging:
+    """
+    The queue, the two handlers, and the listener thread.
+    Add :attr:`handler` to the application's loggers.
+
+    >>> remote = RemoteLogging("localhost", 18842)
+    >>> remote.start()
+    >>> remote.stop()
+    >>> remote.dropped
+    0
+    """
+
+    def __init__(
+        self, host: str, port: int, maxsize: int = 10_000, batch_size: int = 256
+    ) -> None:
+        self.queue: queue.Queue[Any] = queue.Queue(maxsize)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.socket_handler = BatchingSocketHandler(host, port, batch_size)
+        self.listener = BatchingQueueListener(self.queue, self.socket_handler)
+
+    def start(self) -> None:
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Send everything that's been queued, and close the connection."""
+        self.listener.stop()
+        self.socket_handler.close()
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped + self.socket_handler.dropped
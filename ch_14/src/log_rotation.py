@@ -0,0 +1,215 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+A size- and time-rotated target for the log catcher.
+
+The active segment is always written to the same path, for example ``one.log``.
+When it gets too big or too old, it's closed and renamed to ``one.000001.log``,
+and a new active segment is opened.
+Compressing a closed segment with gzip is slow, so it's done by a background thread;
+the writer only pays for a close, a rename, and an open.
+
+A manifest, ``one.manifest.json``, lists the closed segments with the
+wall-clock times of their first and last writes.
+Records are written a few milliseconds after they're created,
+so a reader looking for a time range can skip segments that end before it starts,
+or start after it ends.
+"""
+from collections.abc import Callable, Iterator
+from concurrent import futures
+import gzip
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from types import TracebackType
+from typing import Any, TextIO
+
+
+type Segment = dict[str, Any]
+
+
+class RotatingLog:
+    """
+    A file-like target that rotates at ``max_bytes`` or ``max_seconds``, whichever is first.
+    ``None`` turns off that limit.
+
+    With ``compress``, closed segments are gzipped in the background.
+    With ``keep``, only that many closed segments are kept; older ones are deleted.
+    With ``keep=0``, each segment is deleted as soon as it's closed.
+
+    The limits are checked when a write arrives; an idle segment stays open,
+    and one write (a whole batch from the catcher) is never split across segments.
+    The catcher writes ASCII JSON lines, so size is measured in characters.
+    A non-empty active segment left over from an earlier run is rotated when this opens;
+    its first write time isn't known.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int | None = 64 * 1024 * 1024,
+        max_seconds: float | None = 3600.0,
+        compress: bool = False,
+        keep: int | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if keep is not None and keep < 0:
+            raise ValueError(f"keep={keep} can't be negative")
+        self.path = path
+        self.manifest_path = path.with_name(f"{path.stem}.manifest.json")
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.keep = keep
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.compressor = futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="compress"
+        )
+        self.pending: list[futures.Future[None]] = []
+        self.segments: list[Segment] = []
+        if self.manifest_path.exists():
+            self.segments = json.loads(self.manifest_path.read_text())
+        self.sequence = max((s["sequence"] for s in self.segments), default=0)
+        self.target: TextIO
+        self.size = 0
+        self.lines = 0
+        self.first: float | None = None
+        self.last: float | None = None
+        if path.exists() and path.stat().st_size:
+            self.target = path.open("a")
+            self.last = path.stat().st_mtime
+            self.lines = -1
+            self.rotate()
+        else:
+            self.open()
+
+    def open(self) -> None:
+        self.target = self.path.open("w")
+        self.size = 0
+        self.lines = 0
+        self.first = None
+        self.last = None
+
+    def write(self, text: str) -> int:
+        now = self.clock()
+        if self.size and self.expired(now, len(text)):
+            self.rotate()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.size += len(text)
+        self.lines += text.count("\n")
+        return self.target.write(text)
+
+    def expired(self, now: float, size: int) -> bool:
+        return (self.max_bytes is not None and self.size + size > self.max_bytes) or (
+            self.max_seconds is not None
+            and self.first is not None
+            and now - self.first >= self.max_seconds
+        )
+
+    def flush(self) -> None:
+        self.target.flush()
+
+    def rotate(self) -> None:
+        """Close the active segment, rename it, and start a new one."""
+        self.target.close()
+        self.sequence += 1
+        closed = self.path.with_name(f"{self.path.stem}.{self.sequence:06d}{self.path.suffix}")
+        os.replace(self.path, closed)
+        segment: Segment = {
+            "sequence": self.sequence,
+            "segment": closed.name,
+            "first": self.first,
+            "last": self.last,
+            "lines": None if self.lines < 0 else self.lines,
+            "bytes": closed.stat().st_size,
+        }
+        with self.lock:
+            self.segments.append(segment)
+            expired = self.retire()
+            self.save()
+        for old in expired:
+            (self.path.parent / old["segment"]).unlink(missing_ok=True)
+        if self.compress:
+            self.pending.append(self.compressor.submit(self.gzip, segment))
+            self.pending = [f for f in self.pending if not f.done()]
+        self.open()
+
+    def retire(self) -> list[Segment]:
+        """Remove the oldest segments beyond ``keep`` from the manifest; the lock must be held."""
+        if self.keep is None or len(self.segments) <= self.keep:
+            return []
+        # Not a negative slice: with keep=0, segments[-0:] would keep everything.
+        cut = len(self.segments) - self.keep
+        expired, self.segments = self.segments[:cut], self.segments[cut:]
+        return expired
+
+    def gzip(self, segment: Segment) -> None:
+        """Runs in the background thread."""
+        source = self.path.parent / segment["segment"]
+        compressed = source.with_name(f"{source.name}.gz")
+        partial = source.with_name(f"{source.name}.gz.tmp")
+        try:
+            with source.open("rb") as raw, gzip.open(partial, "wb") as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+        except FileNotFoundError:
+            # Already retired.
+            partial.unlink(missing_ok=True)
+            return
+        os.replace(partial, compressed)
+        with self.lock:
+            segment["segment"] = compressed.name
+            segment["compressed_bytes"] = compressed.stat().st_size
+            if segment in self.segments:
+                self.save()
+        source.unlink(missing_ok=True)
+        if segment not in self.segments:
+            compressed.unlink(missing_ok=True)
+
+    def save(self) -> None:
+        """Replace the manifest in one step, so a reader never sees half of one."""
+        partial = self.manifest_path.with_name(f"{self.manifest_path.name}.tmp")
+        partial.write_text(json.dumps(self.segments, indent=2))
+        os.replace(partial, self.manifest_path)
+
+    def close(self) -> None:
+        """Rotate the last segment, if there's anything in it, and finish any compression."""
+        if self.size:
+            self.rotate()
+        self.target.close()
+        self.path.unlink(missing_ok=True)
+        self.compressor.shutdown(wait=True)
+        for future in self.pending:
+            future.result()
+
+    def __enter__(self) -> "RotatingLog":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def segments(manifest_path: Path, start: float, end: float) -> Iterator[Path]:
+    """
+    The closed segments that might have lines written between ``start`` and ``end``.
+    Segments with an unknown first write time are always included.
+    """
+    for segment in json.loads(manifest_path.read_text()):
+        first, last = segment["first"], segment["last"]
+        if last is not None and last < start:
+            continue
+        if first is not None and first > end:
+            continue
+        yield manifest_path.parent / segment["segment"]
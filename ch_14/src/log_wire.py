@@ -0,0 +1,261 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+A fixed-schema wire format for log records.
+
+:class:`logging.handlers.SocketHandler` pickles each record's ``__dict__``.
+Unpickling data from the network can run arbitrary code,
+and the catcher only wants to turn it into a JSON line anyway.
+This format carries the standard :class:`logging.LogRecord` attributes and nothing else:
+a fixed header with the numbers and the length of each string,
+followed by the UTF-8 bytes of the strings.
+Attributes added with ``extra=`` are not sent.
+Characters that can't be encoded as UTF-8, like lone surrogates, are sent backslash-escaped.
+
+The payload starts with :data:`MAGIC`, which isn't a valid pickle opcode,
+so a catcher can accept both kinds of frame on the same port.
+
+>>> import logging
+>>> record = logging.makeLogRecord(
+...     {"name": "app", "msg": "sorted %d items", "args": (3,), "levelno": 20, "levelname": "INFO"}
+... )
+>>> payload = encode(record)
+>>> fields = decode(payload)
+>>> fields["name"], fields["msg"], fields["args"], fields["levelno"]
+('app', 'sorted 3 items', None, 20)
+>>> import json
+>>> json.loads(to_json(payload)) == fields
+True
+"""
+import json.encoder
+import logging
+import logging.handlers
+import operator
+import struct
+from typing import Any
+
+
+MAGIC = b"\x00LW1"
+
+NUMBER_FIELDS = (
+    "created",
+    "msecs",
+    "relativeCreated",
+    "levelno",
+    "lineno",
+    "process",
+    "thread",
+)
+STRING_FIELDS = (
+    "name",
+    "msg",
+    "levelname",
+    "pathname",
+    "filename",
+    "module",
+    "exc_text",
+    "stack_info",
+    "funcName",
+    "threadName",
+    "processName",
+    "taskName",
+)
+_attributes = operator.attrgetter(*(f for f in STRING_FIELDS if f != "msg"))
+HEADER = struct.Struct(f">4sdddLLQQ{len(STRING_FIELDS)}L")
+
+# ``None`` for an optional integer or string.
+NO_INT = 2**64 - 1
+NO_STR = 2**32 - 1
+
+
+class WireError(ValueError):
+    """The payload isn't a well-formed wire frame."""
+
+
+def encode(record: logging.LogRecord) -> bytes:
+    """
+    The payload for a record; the message is formatted, like ``SocketHandler`` does.
+    Any ``exc_text`` must already be filled in.
+    """
+    (
+        name,
+        levelname,
+        pathname,
+        filename,
+        module,
+        exc_text,
+        stack_info,
+        func_name,
+        thread_name,
+        process_name,
+        task_name,
+    ) = _attributes(record)
+    strings = [
+        None if s is None else s.encode("utf-8", "backslashreplace")
+        for s in (
+            name,
+            record.getMessage(),
+            levelname,
+            pathname,
+            filename,
+            module,
+            exc_text,
+            stack_info,
+            func_name,
+            thread_name,
+            process_name,
+            task_name,
+        )
+    ]
+    header = HEADER.pack(
+        MAGIC,
+        record.created,
+        record.msecs,
+        record.relativeCreated,
+        record.levelno,
+        record.lineno,
+        NO_INT if record.process is None else record.process,
+        NO_INT if record.thread is None else record.thread,
+        *[NO_STR if s is None else len(s) for s in strings],
+    )
+    return header + b"".join(filter(None, strings))
+
+
+def is_wire(payload: bytes) -> bool:
+    return payload.startswith(MAGIC)
+
+
+def unpack(payload: bytes) -> tuple[tuple[Any, ...], list[str | None]]:
+    """The header's numbers, and the strings that follow it."""
+    try:
+        magic, *numbers = HEADER.unpack_from(payload)
+    except struct.error as ex:
+        raise WireError(f"Short frame, {len(payload)} bytes") from ex
+    if magic != MAGIC:
+        raise WireError(f"Unknown frame type {magic!r}")
+    lengths = numbers[len(NUMBER_FIELDS) :]
+    strings: list[str | None] = []
+    start = HEADER.size
+    for length in lengths:
+        if length == NO_STR:
+            strings.append(None)
+        else:
+            strings.append(payload[start : start + length].decode("utf-8", "replace"))
+            start += length
+    if start != len(payload):
+        raise WireError(f"Frame is {len(payload)} bytes, strings end at {start}")
+    return tuple(numbers[: len(NUMBER_FIELDS)]), strings
+
+
+def check(payload: bytes) -> bool:
+    """Is this a well-formed frame? Only the header is unpacked."""
+    try:
+        magic, *numbers = HEADER.unpack_from(payload)
+    except struct.error:
+        return False
+    lengths = numbers[len(NUMBER_FIELDS) :]
+    size = HEADER.size + sum(lengths) - NO_STR * lengths.count(NO_STR)
+    return bool(magic == MAGIC and size == len(payload))
+
+
+def decode(payload: bytes) -> dict[str, Any]:
+    """
+    The fields of a record, in the same order as a pickled ``SocketHandler`` record.
+    """
+    numbers, strings = unpack(payload)
+    created, msecs, relative, levelno, lineno, process, thread = numbers
+    s = dict(zip(STRING_FIELDS, strings))
+    return {
+        "name": s["name"],
+        "msg": s["msg"],
+        "args": None,
+        "levelname": s["levelname"],
+        "levelno": levelno,
+        "pathname": s["pathname"],
+        "filename": s["filename"],
+        "module": s["module"],
+        "exc_info": None,
+        "exc_text": s["exc_text"],
+        "stack_info": s["stack_info"],
+        "lineno": lineno,
+        "funcName": s["funcName"],
+        "created": created,
+        "msecs": msecs,
+        "relativeCreated": relative,
+        "thread": None if thread == NO_INT else thread,
+        "threadName": s["threadName"],
+        "processName": s["processName"],
+        "process": None if process == NO_INT else process,
+        "taskName": s["taskName"],
+    }
+
+
+_quote = json.encoder.encode_basestring_ascii
+
+JSON_LINE = (
+    '{"name": %s, "msg": %s, "args": null, "levelname": %s, "levelno": %d, '
+    '"pathname": %s, "filename": %s, "module": %s, "exc_info": null, '
+    '"exc_text": %s, "stack_info": %s, "lineno": %d, "funcName": %s, '
+    '"created": %r, "msecs": %r, "relativeCreated": %r, "thread": %s, '
+    '"threadName": %s, "processName": %s, "process": %s, "taskName": %s}\n'
+)
+
+
+def to_json(payload: bytes) -> str:
+    """
+    The JSON line for a payload, formatted directly from the decoded fields.
+    It's the same text ``json.dumps(decode(payload)) + "\\n"`` would produce,
+    without building the intermediate ``dict``.
+    """
+    numbers, strings = unpack(payload)
+    created, msecs, relative, levelno, lineno, process, thread = numbers
+    (
+        name,
+        msg,
+        levelname,
+        pathname,
+        filename,
+        module,
+        exc_text,
+        stack_info,
+        func_name,
+        thread_name,
+        process_name,
+        task_name,
+    ) = ("null" if s is None else _quote(s) for s in strings)
+    return JSON_LINE % (
+        name,
+        msg,
+        levelname,
+        levelno,
+        pathname,
+        filename,
+        module,
+        exc_text,
+        stack_info,
+        lineno,
+        func_name,
+        created,
+        msecs,
+        relative,
+        "null" if thread == NO_INT else thread,
+        thread_name,
+        process_name,
+        "null" if process == NO_INT else process,
+        task_name,
+    )
+
+
+class WireSocketHandler(logging.handlers.SocketHandler):
+    """
+    A :class:`logging.handlers.SocketHandler` that sends the wire format instead of a pickle.
+    The ``>L`` length prefix, connection handling, and retries are unchanged.
+    """
+
+    def makePickle(self, record: logging.LogRecord) -> bytes:
+        if record.exc_info and not record.exc_text:
+            self.format(record)
+        payload = encode(record)
+        return struct.pack(">L", len(payload)) + payload
@@ -3,9 +3,18 @@ Python 3 Object-Oriented Programming
 
 Chapter 14.  Concurrency
 """
-from math import sqrt, ceil
+import argparse
+import array
+from collections import defaultdict
+from collections.abc import Sequence
+from math import gcd, isqrt, sqrt, ceil
+import os
 import random
+from multiprocessing import cpu_count, shared_memory
 from multiprocessing.pool import Pool
+import sys
+import time
+from typing import NamedTuple, cast
 
 
 def prime_factors(value: int) -> list[int]:
@@ -29,11 +38,316 @@ def prime_factors(value: int) -> list[int]:
     return factors
 
 
+def sieve(limit: int) -> list[int]:
+    """
+    The primes up to and including ``limit``.
+
+    >>> sieve(30)
+    [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    """
+    flags = bytearray([1]) * (limit + 1)
+    flags[: min(2, limit + 1)] = bytes(min(2, limit + 1))
+    for p in range(2, isqrt(limit) + 1):
+        if flags[p]:
+            flags[p * p :: p] = bytes(len(range(p * p, limit + 1, p)))
+    return [n for n, prime in enumerate(flags) if prime]
+
+
+# With these bases, Miller-Rabin is deterministic below 3.3 * 10**24;
+# above that, a composite passing all twelve is vanishingly unlikely.
+WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+def is_prime(n: int) -> bool:
+    """
+    Miller-Rabin.
+
+    >>> [n for n in range(50) if is_prime(n)]
+    [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47]
+    >>> is_prime(3_215_031_751)  # Fools the bases 2, 3, 5, and 7
+    False
+    """
+    if n < 2:
+        return False
+    for p in WITNESSES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while not d & 1:
+        d, s = d >> 1, s + 1
+    for a in WITNESSES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def pollard_brent(n: int) -> int:
+    """
+    A factor of the composite ``n``, other than 1 and ``n``.
+    Brent's variant of Pollard's rho, which batches the ``gcd()`` calls.
+
+    >>> pollard_brent(1_000_003 * 1_000_033) in {1_000_003, 1_000_033}
+    True
+    """
+    if n % 2 == 0:
+        return 2
+    batch = 128
+    for c in range(1, n):
+        y, r, q, g = 2, 1, 1, 1
+        x = ys = y
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(batch, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += batch
+            r *= 2
+        if g == n:
+            # The batch overshot; step through it one gcd at a time.
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+    raise ValueError(f"{n} is prime")
+
+
+class FactorEngine:
+    """
+    Factor by trial division with a table of small primes,
+    then Miller-Rabin and Pollard's rho for what's left.
+
+    The table covers primes up to the square root of the largest expected value,
+    but no further than ``trial_limit``: past a thousand or so, another trial division
+    costs more than a Miller-Rabin test and a rho split.
+
+    The result is the same as :func:`prime_factors`: the factors in ascending order,
+    with repeats. Values less than 2 are their own factor list.
+
+    >>> engine = FactorEngine(1_000_000_000)
+    >>> engine.factors(42)
+    [2, 3, 7]
+    >>> engine.factors(1)
+    [1]
+    >>> engine.factors(999_966_000_289) == [999_983, 999_983]
+    True
+    """
+
+    def __init__(
+        self, largest: int, trial_limit: int = 1_000, primes: Sequence[int] | None = None
+    ) -> None:
+        if primes is None:
+            primes = sieve(min(isqrt(max(largest, 4)), trial_limit))
+        self.primes = primes
+        # Without a factor in the table, anything smaller than this is prime.
+        self.bound = (self.primes[-1] + 1) ** 2
+
+    def factors(self, value: int) -> list[int]:
+        if value < 0:
+            raise ValueError("math domain error")
+        if value < 2:
+            return [value]
+        factors: list[int] = []
+        n = value
+        for p in self.primes:
+            if p * p > n:
+                break
+            while n % p == 0:
+                factors.append(p)
+                n //= p
+        if n == 1:
+            return factors
+        if n < self.bound:
+            factors.append(n)
+            return factors
+        composites = [n]
+        while composites:
+            n = composites.pop()
+            if n < self.bound or is_prime(n):
+                factors.append(n)
+            else:
+                divisor = pollard_brent(n)
+                composites.extend([divisor, n // divisor])
+        factors.sort()
+        return factors
+
+
+ENGINE: FactorEngine
+
+
+def init_worker(largest: int) -> None:
+    """A :class:`multiprocessing.pool.Pool` initializer: build the prime table once per worker."""
+    global ENGINE
+    ENGINE = FactorEngine(largest)
+
+
+def fast_prime_factors(value: int) -> list[int]:
+    """:func:`prime_factors`, using this worker's :class:`FactorEngine`."""
+    return ENGINE.factors(value)
+
+
+class WorkerReport(NamedTuple):
+    pid: int
+    values: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.values / self.seconds if self.seconds else 0.0
+
+
+class BatchReport(NamedTuple):
+    chunksize: int
+    seconds: float
+    workers: list[WorkerReport]
+
+    @property
+    def values(self) -> int:
+        return sum(w.values for w in self.workers)
+
+    @property
+    def rate(self) -> float:
+        return self.values / self.seconds if self.seconds else 0.0
+
+
+def attach_table(name: str, count: int) -> None:
+    """
+    A :class:`multiprocessing.pool.Pool` initializer: use the parent's prime table.
+    The table is small, so the worker copies it out of shared memory,
+    rather than pay for slower iteration over a ``memoryview`` for every value.
+    """
+    global ENGINE
+    if sys.version_info >= (3, 13):
+        shared = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        # Before 3.13, there's no ``track``. Attaching registers the block again
+        # with the resource tracker the workers share with the parent;
+        # that's harmless, and the parent's unlink() unregisters it.
+        shared = shared_memory.SharedMemory(name=name)
+    table = array.array("I", bytes(cast(memoryview, shared.buf)[: count * 4]))
+    shared.close()
+    ENGINE = FactorEngine(0, primes=table.tolist())
+
+
+def factor_chunk(chunk: list[int]) -> tuple[int, float, list[list[int]]]:
+    start = time.perf_counter()
+    results = [ENGINE.factors(value) for value in chunk]
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def choose_chunksize(
+    values: Sequence[int],
+    workers: int,
+    engine: FactorEngine,
+    target_seconds: float = 0.050,
+    sample: int = 64,
+) -> int:
+    """
+    Time a sample of the values, and pick a chunk that takes about ``target_seconds``.
+    Small chunks cost more round trips to the workers;
+    large chunks leave workers idle at the end.
+    There are always at least four chunks per worker.
+    """
+    sampled = values[:: max(1, len(values) // sample)][:sample]
+    start = time.perf_counter()
+    for value in sampled:
+        engine.factors(value)
+    per_value = (time.perf_counter() - start) / max(1, len(sampled))
+    by_time = int(target_seconds / per_value) if per_value else len(values)
+    balanced = ceil(len(values) / (4 * workers))
+    return max(1, min(by_time, balanced))
+
+
+def factor_batch(
+    values: Sequence[int],
+    workers: int | None = None,
+    chunksize: int | None = None,
+) -> tuple[list[list[int]], BatchReport]:
+    """
+    Factor all of the values with a pool of workers.
+
+    The prime table is built once, here, and put in shared memory;
+    each worker attaches to it when it starts.
+    Without a ``chunksize``, one is chosen from a timed sample.
+    The results are in the same order as the values.
+
+    >>> results, report = factor_batch([12, 97, 1_000_003**2], workers=2)
+    >>> results
+    [[2, 2, 3], [97], [1000003, 1000003]]
+    >>> report.values
+    3
+    """
+    workers = workers or cpu_count()
+    engine = FactorEngine(max(values, default=4))
+    table = array.array("I", engine.primes)
+    chunksize = chunksize or choose_chunksize(values, workers, engine)
+    chunks = [list(values[i : i + chunksize]) for i in range(0, len(values), chunksize)]
+    results: list[list[int]] = []
+    counts: defaultdict[int, int] = defaultdict(int)
+    seconds: defaultdict[int, float] = defaultdict(float)
+    shared = shared_memory.SharedMemory(create=True, size=max(1, len(table) * 4))
+    try:
+        cast(memoryview, shared.buf)[: len(table) * 4] = table.tobytes()
+        start = time.perf_counter()
+        with Pool(
+            workers, initializer=attach_table, initargs=(shared.name, len(table))
+        ) as pool:
+            for pid, chunk_seconds, chunk_results in pool.imap(factor_chunk, chunks):
+                results.extend(chunk_results)
+                counts[pid] += len(chunk_results)
+                seconds[pid] += chunk_seconds
+        elapsed = time.perf_counter() - start
+    finally:
+        shared.close()
+        shared.unlink()
+    workers_report = [WorkerReport(pid, counts[pid], seconds[pid]) for pid in sorted(counts)]
+    return results, BatchReport(chunksize, elapsed, workers_report)
+
+
+def get_options(argv: list[str] = sys.argv[1:]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=["trial", "fast", "batch"], default="batch")
+    parser.add_argument("--count", type=int, default=40_960)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    to_factor = [random.randint(100_000_000, 1_000_000_000) for i in range(40_960)]
-    with Pool() as pool:
-        results = pool.map(prime_factors, to_factor)
+    options = get_options()
+    to_factor = [
+        random.randint(100_000_000, 1_000_000_000) for i in range(options.count)
+    ]
+    start = time.perf_counter()
+    if options.engine == "batch":
+        results, report = factor_batch(to_factor)
+        for worker in report.workers:
+            print(
+                f"worker {worker.pid}: {worker.values:,d} values, "
+                f"{worker.seconds:.3f}s, {worker.rate:,.0f}/s"
+            )
+        print(f"chunksize {report.chunksize}, overall {report.rate:,.0f}/s")
+    elif options.engine == "fast":
+        with Pool(initializer=init_worker, initargs=(max(to_factor),)) as pool:
+            results = pool.map(fast_prime_factors, to_factor)
+    else:
+        with Pool() as pool:
+            results = pool.map(prime_factors, to_factor)
+    end = time.perf_counter()
     primes = [
         value for value, factor_list in zip(to_factor, results) if len(factor_list) == 1
     ]
     print(f"9-digit primes {primes}")
+    print(f"{options.engine}: factored {len(to_factor):,d} values in {end - start:.3f}s")
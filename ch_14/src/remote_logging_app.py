@@ -7,12 +7,13 @@ import abc
 from collections.abc import Iterable
 from itertools import permutations
 import logging
-import logging.handlers
 import os
 import random
 import time
 import sys
 
+from log_client import RemoteLogging
+
 
 logger = logging.getLogger(f"app_{os.getpid()}")
 
@@ -82,9 +83,10 @@ def main(workload: int = 10, sorter: Sorter = BogoSort()) -> int:
 
 if __name__ == "__main__":
     LOG_HOST, LOG_PORT = "localhost", 18842
-    socket_handler = logging.handlers.SocketHandler(LOG_HOST, LOG_PORT)
+    remote = RemoteLogging(LOG_HOST, LOG_PORT)
     stream_handler = logging.StreamHandler(sys.stderr)
-    logging.basicConfig(handlers=[socket_handler, stream_handler], level=logging.INFO)
+    logging.basicConfig(handlers=[remote.handler, stream_handler], level=logging.INFO)
+    remote.start()
 
     start = time.perf_counter()
 
@@ -95,4 +97,7 @@ if __name__ == "__main__":
     end = time.perf_counter()
     logger.info("produced %d entries, taking %f s", workload * 2 + 2, end - start)
 
+    remote.stop()
+    if remote.dropped:
+        print(f"{remote.dropped} log records dropped", file=sys.stderr)
     logging.shutdown()
@@ -0,0 +1,95 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+
+A directory walker shared by code_search and directory_search.
+"""
+from collections.abc import Iterable, Iterator
+from concurrent import futures
+from fnmatch import translate
+import os
+from pathlib import Path
+import re
+import time
+
+
+SKIP = frozenset({".tox", ".mypy_cache", "__pycache__", ".idea", ".venv"})
+
+
+class SourceWalker:
+    """
+    Walk a directory tree with :func:`os.scandir`, yielding files that match any of the patterns.
+
+    Each top-level subdirectory is walked by a separate thread.
+    Directory scanning and ``stat()`` calls are I/O; they release the GIL and can overlap.
+    The ``stat()`` of each matching file is done in the worker thread,
+    and cached by its :class:`os.DirEntry`.
+
+    Directories with names in ``skip`` are not entered.
+    The ``files`` and ``seconds`` attributes describe the most recent walk.
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[str] = ("*.py",),
+        skip: Iterable[str] = SKIP,
+        workers: int = 8,
+    ) -> None:
+        self.pattern = re.compile("|".join(translate(p) for p in patterns))
+        self.skip = frozenset(skip)
+        self.workers = workers
+        self.files = 0
+        self.seconds = 0.0
+
+    def matches(self, entry: os.DirEntry[str]) -> bool:
+        return self.pattern.match(os.path.normcase(entry.name)) is not None
+
+    def scan(self, top: str) -> list[os.DirEntry[str]]:
+        found: list[os.DirEntry[str]] = []
+        directories = [top]
+        while directories:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.skip:
+                                directories.append(entry.path)
+                        elif self.matches(entry):
+                            entry.stat()
+                            found.append(entry)
+            except OSError:
+                continue
+        return found
+
+    def entries(self, path: Path) -> Iterator[os.DirEntry[str]]:
+        start = time.perf_counter()
+        self.files = 0
+        scanners: list[futures.Future[list[os.DirEntry[str]]]] = []
+        with futures.ThreadPoolExecutor(self.workers) as pool:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in self.skip:
+                            scanners.append(pool.submit(self.scan, entry.path))
+                    elif self.matches(entry):
+                        self.files += 1
+                        yield entry
+            for scanner in scanners:
+                found = scanner.result()
+                self.files += len(found)
+                yield from found
+        self.seconds = time.perf_counter() - start
+
+    def walk(self, path: Path) -> Iterator[Path]:
+        yield from (Path(entry.path) for entry in self.entries(path))
+
+    def sized(self, path: Path) -> Iterator[tuple[Path, int]]:
+        yield from (
+            (Path(entry.path), entry.stat().st_size) for entry in self.entries(path)
+        )
+
+    @property
+    def rate(self) -> float:
+        """Files per second for the most recent walk."""
+        return self.files / self.seconds if self.seconds else 0.0
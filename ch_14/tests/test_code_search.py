@@ -54,7 +54,7 @@ def test_typing(mock_code_2):
 def mock_futures_pool(tmp_path, monkeypatch):
     future = Mock(
         result=Mock(
-            return_value=code_search.ImportResult(tmp_path/"code.py", {"typing"}))
+            return_value=(code_search.ImportResult(tmp_path/"file1.py", {"typing"}), "fast"))
     )
     context = MagicMock(
         submit=Mock(return_value=future)
@@ -65,7 +65,7 @@ def mock_futures_pool(tmp_path, monkeypatch):
     pool_class = Mock(
         return_value=pool
     )
-    monkeypatch.setattr(code_search.futures, 'ThreadPoolExecutor', pool_class)
+    monkeypatch.setattr(code_search.futures, 'ProcessPoolExecutor', pool_class)
     as_completed = Mock(
         side_effect=lambda futures: futures
     )
@@ -75,6 +75,7 @@ def mock_futures_pool(tmp_path, monkeypatch):
 @pytest.fixture
 def mock_all_source(tmp_path, monkeypatch):
     paths = [tmp_path / "file1.py"]
+    paths[0].write_text("from typing import Any\n")
     function = Mock(return_value=paths)
     monkeypatch.setattr(code_search, 'all_source', function)
     return paths
@@ -90,18 +91,106 @@ def mock_time(monkeypatch):
 def test_main(mock_all_source, mock_futures_pool, mock_time, tmp_path, capsys, monkeypatch):
     monkeypatch.chdir(tmp_path)
     code_search.main(tmp_path)
-    assert mock_futures_pool.mock_calls == [call(24)]
+    assert mock_futures_pool.mock_calls == [call()]
     context = mock_futures_pool.return_value.__enter__.return_value
     assert context.submit.mock_calls == [
-        call(code_search.find_imports, tmp_path/"file1.py")
+        call(code_search.analyze, tmp_path/"file1.py", "fast")
     ]
     future = context.submit.return_value
     assert future.result.mock_calls == [call()]
     out, err = capsys.readouterr()
-    target_path = "code.py"
+    target_path = "file1.py"
     assert out.splitlines() == [
         '',
         str(tmp_path),
         f"-> {str(target_path)} {{'typing'}}",
-        f"Searched 1 files in {str(tmp_path)} at 420.000ms/file",
+        f"Searched 1 files in {str(tmp_path)} at 420.000ms/file (cache 0, fast 1, ast 0)",
+        "Cache 0 hits, 1 misses",
     ]
+
+
+def test_main_cached(mock_all_source, mock_futures_pool, mock_time, tmp_path, capsys):
+    cache = code_search.ImportCache()
+    cache.get(mock_all_source[0])
+    cache.put(code_search.ImportResult(mock_all_source[0], {"typing"}))
+    code_search.main(tmp_path, cache)
+    assert mock_futures_pool.mock_calls == []
+    out, err = capsys.readouterr()
+    assert out.splitlines()[-1] == "Cache 1 hits, 1 misses"
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "import math\nprint(math.pi)\n",
+        '"""Docstring."""\n# comment\nimport os.path as osp, sys\nfrom . import a\nfrom ..b.c import (\n    d,\n    e as f,\n)\n',
+        "from __future__ import annotations\nimport pandas as pd\nx = 1\n",
+        "import os\ndef f():\n    import json\n",
+        "import os\nif True: import json\n",
+        "try:\n    import tomllib\nexcept ImportError:\n    tomllib = None\n",
+        "import os; import sys\n",
+        "x = 1\n",
+        "",
+    ]
+)
+def test_engines_agree(tmp_path, source):
+    path = tmp_path / "code.py"
+    path.write_text(source)
+    fast, fast_engine = code_search.analyze(path, "fast")
+    full, full_engine = code_search.analyze(path, "ast")
+    assert fast == full == code_search.find_imports(path)
+    assert full_engine == "ast"
+
+
+def test_fast_engine_used(mock_code_2):
+    result, engine = code_search.analyze(mock_code_2)
+    assert engine == "fast"
+    assert result == code_search.ImportResult(mock_code_2, {"math", "typing"})
+
+
+def test_import_cache(mock_code_1, tmp_path):
+    cache_path = tmp_path / "cache.json"
+    cache = code_search.ImportCache(cache_path)
+    assert cache.get(mock_code_1) is None
+    cache.put(code_search.find_imports(mock_code_1))
+    cache.save()
+
+    warm = code_search.ImportCache(cache_path)
+    assert warm.get(mock_code_1) == code_search.ImportResult(mock_code_1, {"math"})
+    assert (warm.hits, warm.misses) == (1, 0)
+
+    mock_code_1.write_text("import math, typing\nprint(math.pi)\n")
+    assert warm.get(mock_code_1) is None
+    assert (warm.hits, warm.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("text", ["not json", "[]", "null", '{"a.py": 1}'])
+def test_import_cache_damaged(tmp_path, text):
+    cache_path = tmp_path / "cache.json"
+    cache_path.write_text(text)
+    cache = code_search.ImportCache(cache_path)
+    assert cache.entries == {}
+
+
+def test_import_graph(tmp_path):
+    graph = code_search.ImportGraph(tmp_path)
+    graph.extend([
+        code_search.ImportResult(tmp_path / "pkg" / "__init__.py", {"pkg.core"}),
+        code_search.ImportResult(tmp_path / "pkg" / "core.py", {"json"}),
+        code_search.ImportResult(tmp_path / "app.py", {"pkg"}),
+        code_search.ImportResult(tmp_path / "tool.py", {"os"}),
+    ])
+    assert graph.importers("json") == {
+        tmp_path / "pkg" / "core.py",
+        tmp_path / "pkg" / "__init__.py",
+        tmp_path / "app.py",
+    }
+    assert graph.importers("pkg.core") == {tmp_path / "pkg" / "__init__.py", tmp_path / "app.py"}
+    assert graph.importers("missing") == set()
+
+    # An incremental change replaces only that file's edges.
+    graph.add(code_search.ImportResult(tmp_path / "tool.py", {"os", "app"}))
+    assert tmp_path / "tool.py" in graph.importers("json")
+    graph.remove(tmp_path / "pkg" / "core.py")
+    assert graph.importers("json") == set()
+    assert graph.importers("pkg") == {tmp_path / "app.py", tmp_path / "tool.py"}
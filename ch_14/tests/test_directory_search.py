@@ -3,7 +3,7 @@ Python 3 Object-Oriented Programming
 
 Chapter 14.  Concurrency
 """
-from unittest.mock import Mock, call
+from unittest.mock import ANY, Mock, call
 import pytest
 import directory_search
 
@@ -31,11 +31,57 @@ def mock_paths(tmp_path):
 def test_search(mock_paths, mock_query_queue, mock_result_queue):
     directory_search.search(mock_paths, mock_query_queue, mock_result_queue)
     assert mock_query_queue.get.mock_calls == [call(), call()]
+    report = mock_result_queue.put.mock_calls[-1].args[0]
+    assert isinstance(report, directory_search.WorkerReport)
+    assert report.lines == 2
+    assert report.matches == 1
     assert mock_result_queue.put.mock_calls == [
-        call(['file2 contains xyzzy'])
+        call(['file2 contains xyzzy']),
+        call(ANY)
     ]
 
 
+@pytest.fixture
+def mock_many_paths(tmp_path):
+    f1 = tmp_path / "file1"
+    f1.write_text("".join(f"xyzzy {i}\n" for i in range(5)))
+    return [f1]
+
+
+def test_search_batches(mock_many_paths, mock_query_queue, mock_result_queue):
+    directory_search.search(
+        mock_many_paths, mock_query_queue, mock_result_queue, batch_size=2
+    )
+    assert mock_result_queue.put.mock_calls == [
+        call(['xyzzy 0', 'xyzzy 1']),
+        call(['xyzzy 2', 'xyzzy 3']),
+        call(['xyzzy 4']),
+        call(ANY)
+    ]
+
+
+def test_search_cancel(mock_many_paths, mock_query_queue, mock_result_queue):
+    cancel = Mock(is_set=Mock(side_effect=[False, False, False, True]))
+    directory_search.search(
+        mock_many_paths, mock_query_queue, mock_result_queue, cancel, batch_size=2
+    )
+    assert cancel.is_set.call_count == 4
+    assert mock_result_queue.put.mock_calls == [
+        call(['xyzzy 0', 'xyzzy 1']),
+        call(ANY)
+    ]
+
+
+def test_search_cancelled(mock_many_paths, mock_query_queue, mock_result_queue):
+    cancel = Mock(is_set=Mock(return_value=True))
+    directory_search.search(
+        mock_many_paths, mock_query_queue, mock_result_queue, cancel, batch_size=2
+    )
+    report = mock_result_queue.put.mock_calls[-1].args[0]
+    assert report.matches == 0
+    assert mock_result_queue.put.mock_calls == [call(ANY)]
+
+
 @pytest.fixture
 def mock_directory(tmp_path):
     f1 = tmp_path / "file1.py"
@@ -53,12 +99,14 @@ def test_all_source(mock_directory):
     ]
 
 
+REPORT = directory_search.WorkerReport(pid=42, lines=1, matches=1, seconds=0.001)
+
 @pytest.fixture
 def mock_queue(monkeypatch):
     mock_instance = Mock(
         name="mock Queue",
         put=Mock(),
-        get=Mock(return_value=["line with text"])
+        get=Mock(side_effect=[["line with text"], REPORT] * 2)
     )
     mock_queue_class = Mock(
         return_value=mock_instance
@@ -80,32 +128,83 @@ def mock_process(monkeypatch):
     monkeypatch.setattr(directory_search, "Process", mock_process_class)
     return mock_process_class
 
-def test_directory_search(mock_queue, mock_process, mock_paths):
+@pytest.fixture
+def mock_event(monkeypatch):
+    mock_instance = Mock(
+        name="mock Event",
+        set=Mock(),
+        clear=Mock()
+    )
+    mock_event_class = Mock(
+        return_value=mock_instance
+    )
+    monkeypatch.setattr(directory_search, "Event", mock_event_class)
+    return mock_event_class
+
+def test_directory_search(mock_queue, mock_process, mock_event, mock_paths):
     ds_instance = directory_search.DirectorySearch()
     ds_instance.setup_search(mock_paths, cpus=2)
 
-    assert mock_queue.mock_calls == [call(), call(), call()]
+    assert mock_queue.mock_calls == [
+        call(), call(), call(maxsize=directory_search.RESULTS_MAXSIZE)
+    ]
+    cancel = mock_event.return_value
     assert mock_process.mock_calls == [
         call(
             target=directory_search.search,
-            args=(mock_paths[0::2], mock_queue.return_value, mock_queue.return_value)
+            args=([mock_paths[1]], mock_queue.return_value, mock_queue.return_value, cancel)
         ),
         call(
             target=directory_search.search,
-            args=(mock_paths[1::2], mock_queue.return_value, mock_queue.return_value)
+            args=([mock_paths[0]], mock_queue.return_value, mock_queue.return_value, cancel)
         )
     ]
     assert mock_process.return_value.start.mock_calls == [call(), call()]
     assert ds_instance.query_queues == [mock_queue.return_value, mock_queue.return_value]
     assert ds_instance.results_queue == mock_queue.return_value
     assert ds_instance.search_workers == [mock_process.return_value, mock_process.return_value ]
+    assert ds_instance.shard_bytes == [21, 13]
 
     result = list(ds_instance.search("text"))
 
     assert result == ['line with text', 'line with text']
     assert mock_queue.return_value.put.mock_calls == [call("text"), call("text")]
-    assert mock_queue.return_value.get.mock_calls == [call(), call()]
+    assert mock_queue.return_value.get.mock_calls == [call(), call(), call(), call()]
+    assert cancel.set.mock_calls == []
+    assert ds_instance.reports == [REPORT, REPORT]
 
     ds_instance.teardown_search()
     assert mock_queue.return_value.put.mock_calls == [call("text"), call("text"), call(None), call(None)]
     assert mock_process.return_value.join.mock_calls == [call(), call()]
+
+
+def test_plan_shards(tmp_path):
+    paths = []
+    for name, size in [("a", 10), ("b", 90), ("c", 40), ("d", 50), ("e", 10)]:
+        path = tmp_path / name
+        path.write_text("x" * size)
+        paths.append(path)
+    shards = directory_search.plan_shards(paths, 2)
+    assert [[p.name for p in shard] for shard in shards] == [["b", "a"], ["d", "c", "e"]]
+    assert [sum(p.stat().st_size for p in shard) for shard in shards] == [100, 100]
+
+
+def test_trigram_index():
+    lines = ["import os", "from pathlib import Path", "class Spam:", "    def spam(self):", ""]
+    index = directory_search.TrigramIndex(lines)
+    for query in ("import", "spam", "Sp", "s", "xyzzy", "port os", "", "def spam(self):"):
+        assert index.search(query) == [line for line in lines if query in line]
+
+
+def test_directory_search_limit(mock_queue, mock_process, mock_event, mock_paths):
+    ds_instance = directory_search.DirectorySearch()
+    ds_instance.setup_search(mock_paths, cpus=2)
+    mock_queue.return_value.get.side_effect = [["line 1", "line 2"], REPORT, ["line 3"], REPORT]
+
+    result = list(ds_instance.search("line", limit=1))
+
+    assert result == ['line 1']
+    cancel = mock_event.return_value
+    assert cancel.set.mock_calls == [call()]
+    # Remaining batches are drained up to each worker's end-of-query marker
+    assert mock_queue.return_value.get.mock_calls == [call(), call(), call(), call()]
@@ -4,11 +4,19 @@ Python 3 Object-Oriented Programming
 Chapter 14.  Concurrency
 """
 import asyncio
+import json
+import logging
 import pickle
 import struct
 from unittest.mock import AsyncMock, Mock, call
 import pytest
 import log_catcher
+import log_wire
+
+@pytest.fixture
+def accept_pickle(monkeypatch):
+    """These tests send pickles, like a plain SocketHandler, as with --accept-pickle."""
+    monkeypatch.setattr(log_catcher, "ACCEPT_PICKLE", True)
 
 @pytest.fixture
 def mock_target(monkeypatch):
@@ -16,15 +24,57 @@ def mock_target(monkeypatch):
     log_catcher.TARGET = open_file
     return open_file
 
-def test_log_writer(mock_target, capsys):
+def test_serialize(mock_target):
     payload = pickle.dumps("message")
-    asyncio.run(log_catcher.log_writer(payload))
+    log_catcher.serialize(payload)
     assert mock_target.write.mock_calls == [
         call('"message"'),
         call('\n')
     ]
 
 
+def test_log_writer(mock_target, capsys):
+    payload = pickle.dumps("message")
+
+    async def write_one() -> None:
+        log_catcher.WRITER = log_catcher.BatchWriter()
+        log_catcher.WRITER.start()
+        await log_catcher.log_writer(payload)
+        await log_catcher.WRITER.close()
+
+    asyncio.run(write_one())
+    assert mock_target.write.mock_calls == [
+        call('"message"\n')
+    ]
+
+
+def test_batch_writer(mock_target):
+    payloads = [pickle.dumps({"n": n}) for n in range(5)]
+
+    async def write_all() -> log_catcher.BatchWriter:
+        writer = log_catcher.BatchWriter(maxsize=10, batch_size=2, batch_seconds=0.01)
+        for payload in payloads:
+            await writer.put(payload)
+        writer.start()
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(write_all())
+    assert mock_target.write.mock_calls == [
+        call('{"n": 0}\n{"n": 1}\n'),
+        call('{"n": 2}\n{"n": 3}\n'),
+        call('{"n": 4}\n'),
+    ]
+    assert writer.metrics.as_dict() == {
+        "records": 5,
+        "batches": 3,
+        "failed_batches": 0,
+        "max_queue_depth": 5,
+        "mean_batch_size": 5 / 3,
+        "largest_batch": 2,
+    }
+
+
 @pytest.fixture
 def mock_log_writer(monkeypatch):
     log_writer = AsyncMock()
@@ -39,15 +89,133 @@ def mock_stream():
     payload = pickle.dumps("message")
     size = struct.pack(">L", len(payload))
     stream = Mock(
-        read=AsyncMock(side_effect=[size, payload, None]),
+        readexactly=AsyncMock(
+            side_effect=[size, payload, asyncio.IncompleteReadError(b"", 4)]
+        ),
         get_extra_info=Mock(return_value=mock_socket)
     )
     return payload, stream
 
 
-def test_log_catcher(mock_log_writer, mock_stream):
+def test_log_catcher(accept_pickle, mock_log_writer, mock_stream):
     payload, stream = mock_stream
     asyncio.run(log_catcher.log_catcher(stream, stream))
     # Depends on len(payload)
-    assert stream.read.mock_calls == [call(4), call(22), call(4)]
+    assert stream.readexactly.mock_calls == [call(4), call(22), call(4)]
     mock_log_writer.assert_awaited_with(payload)
+
+
+@pytest.fixture
+def mock_writer(monkeypatch):
+    writer = Mock(put_nowait=Mock(return_value=True))
+    monkeypatch.setattr(log_catcher, "WRITER", writer, raising=False)
+    return writer
+
+
+def frames(*payloads):
+    return b"".join(struct.pack(">L", len(p)) + p for p in payloads)
+
+
+def receive(protocol, data, chunk_size):
+    """Mimic the event loop: each read fills as much of the buffer as it can."""
+    start = 0
+    while start < len(data):
+        buffer = protocol.get_buffer(chunk_size)
+        chunk = data[start : start + min(chunk_size, len(buffer))]
+        buffer[: len(chunk)] = chunk
+        protocol.buffer_updated(len(chunk))
+        start += len(chunk)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_protocol_framing(accept_pickle, mock_writer, chunk_size):
+    payloads = [pickle.dumps(f"message {n}" * n) for n in range(20)]
+    protocol = log_catcher.LogCatcherProtocol(buffer_size=64)
+    protocol.connection_made(Mock())
+    receive(protocol, frames(*payloads), chunk_size)
+    assert mock_writer.put_nowait.mock_calls == [call(p) for p in payloads]
+    assert protocol.start == protocol.end == 0
+
+
+def test_protocol_backpressure(accept_pickle, mock_writer):
+    mock_writer.put_nowait.side_effect = [True, False]
+    mock_writer.put = AsyncMock()
+    transport = Mock(is_closing=Mock(return_value=False))
+
+    async def receive_all() -> None:
+        protocol = log_catcher.LogCatcherProtocol()
+        protocol.connection_made(transport)
+        receive(protocol, frames(b"one", b"two", b"three"), 1000)
+        assert transport.pause_reading.mock_calls == [call()]
+        await protocol.drainer
+
+    asyncio.run(receive_all())
+    assert mock_writer.put.mock_calls == [call(b"two"), call(b"three")]
+    assert transport.resume_reading.mock_calls == [call()]
+
+
+def test_protocol_partial_frame(accept_pickle, mock_writer, monkeypatch, capsys):
+    monkeypatch.setattr(log_catcher, "CORRUPT_FRAMES", 0)
+    protocol = log_catcher.LogCatcherProtocol()
+    protocol.connection_made(Mock(get_extra_info=Mock(return_value=("127.0.0.1", 12342))))
+    receive(protocol, frames(b"complete") + struct.pack(">L", 10) + b"part", 1000)
+    protocol.connection_lost(None)
+    assert mock_writer.put_nowait.mock_calls == [call(b"complete")]
+    assert log_catcher.CORRUPT_FRAMES == 1
+    out, err = capsys.readouterr()
+    assert out == "From ('127.0.0.1', 12342): 1 lines\n"
+
+
+def test_serialize_batch_formats(mock_target):
+    record = logging.makeLogRecord({"msg": "wire %d", "args": (1,), "levelno": 20})
+    payloads = [log_wire.encode(record), pickle.dumps({"n": 2})]
+    log_catcher.serialize_batch(payloads)
+    (written,) = mock_target.write.mock_calls
+    first, second = written.args[0].splitlines()
+    assert json.loads(first)["msg"] == "wire 1"
+    assert second == '{"n": 2}'
+
+
+def test_accept(monkeypatch):
+    monkeypatch.setattr(log_catcher, "CORRUPT_FRAMES", 0)
+    monkeypatch.setattr(log_catcher, "REJECTED_FRAMES", 0)
+    wire = log_wire.encode(logging.makeLogRecord({"msg": "wire", "levelno": 20}))
+    assert log_catcher.accept(wire)
+    assert not log_catcher.accept(pickle.dumps("message"))
+    assert not log_catcher.accept(wire[:-1])
+    monkeypatch.setattr(log_catcher, "ACCEPT_PICKLE", True)
+    assert log_catcher.accept(wire)
+    assert log_catcher.accept(pickle.dumps("message"))
+    assert (log_catcher.CORRUPT_FRAMES, log_catcher.REJECTED_FRAMES) == (1, 1)
+
+
+def test_get_options_accept_pickle():
+    assert not log_catcher.get_options([]).accept_pickle
+    assert log_catcher.get_options(["--accept-pickle"]).accept_pickle
+
+
+def test_batch_writer_bad_frames(mock_target, monkeypatch):
+    monkeypatch.setattr(log_catcher, "UNDECODABLE_FRAMES", 0)
+    payloads = [pickle.dumps({"n": 1}), b"not a pickle", pickle.dumps({"n": 3})]
+
+    async def write_all() -> log_catcher.BatchWriter:
+        writer = log_catcher.BatchWriter(maxsize=10, batch_size=10, batch_seconds=0.01)
+        writer.start()
+        for payload in payloads:
+            await writer.put(payload)
+        await writer.close()
+        # A batch that fails to write doesn't stop the writer, either.
+        mock_target.write.side_effect = [OSError("disk full"), None]
+        writer.start()
+        await writer.put(payloads[0])
+        await writer.close()
+        writer.start()
+        await writer.put(payloads[2])
+        await asyncio.wait_for(writer.close(), 1)
+        return writer
+
+    writer = asyncio.run(write_all())
+    assert mock_target.write.mock_calls[0] == call('{"n": 1}\n{"n": 3}\n')
+    assert mock_target.write.mock_calls[-1] == call('{"n": 3}\n')
+    assert log_catcher.UNDECODABLE_FRAMES == 1
+    assert writer.metrics.failed_batches == 1
@@ -0,0 +1,100 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+"""
+import logging
+import queue
+import socket
+import struct
+from unittest.mock import Mock
+import pytest
+import log_client
+import log_wire
+
+
+def make_record(n: int) -> logging.LogRecord:
+    return logging.makeLogRecord({"msg": "record %d", "args": (n,), "levelno": 20})
+
+
+def read_frames(sock: socket.socket, count: int) -> list[dict]:
+    stream = sock.makefile("rb")
+    frames = []
+    for _ in range(count):
+        (size,) = struct.unpack(">L", stream.read(4))
+        frames.append(log_wire.decode(stream.read(size)))
+    return frames
+
+
+def test_dropping_queue_handler():
+    handler = log_client.DroppingQueueHandler(queue.Queue(2))
+    for n in range(5):
+        handler.handle(make_record(n))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_batching(monkeypatch):
+    mock_socket = Mock()
+    handler = log_client.BatchingSocketHandler("localhost", 0, batch_size=2)
+    monkeypatch.setattr(handler, "makeSocket", Mock(return_value=mock_socket))
+    for n in range(3):
+        handler.handle(make_record(n))
+    assert len(mock_socket.sendall.mock_calls) == 1
+    handler.flush()
+    assert len(mock_socket.sendall.mock_calls) == 2
+    assert (handler.sent, handler.dropped) == (3, 0)
+
+
+def test_catcher_down(monkeypatch):
+    make_socket = Mock(side_effect=ConnectionRefusedError)
+    handler = log_client.BatchingSocketHandler("localhost", 0, batch_size=2, retry_start=60)
+    monkeypatch.setattr(handler, "makeSocket", make_socket)
+    for n in range(5):
+        handler.handle(make_record(n))
+    handler.flush()
+    assert (handler.sent, handler.dropped) == (0, 5)
+    # The second and third batches are dropped during the backoff, without a connection attempt.
+    assert len(make_socket.mock_calls) == 1
+
+
+@pytest.fixture
+def socket_pair(monkeypatch):
+    client, server = socket.socketpair()
+    yield client, server
+    client.close()
+    server.close()
+
+
+def test_remote_logging(monkeypatch, socket_pair):
+    client, server = socket_pair
+    remote = log_client.RemoteLogging("localhost", 0, batch_size=4)
+    monkeypatch.setattr(remote.socket_handler, "makeSocket", Mock(return_value=client))
+    remote.start()
+    for n in range(10):
+        remote.handler.handle(make_record(n))
+    remote.stop()
+    assert [f["msg"] for f in read_frames(server, 10)] == [f"record {n}" for n in range(10)]
+    assert remote.dropped == 0
+
+
+def test_remote_logging_basic_config(monkeypatch, socket_pair):
+    client, server = socket_pair
+    remote = log_client.RemoteLogging("localhost", 0)
+    monkeypatch.setattr(remote.socket_handler, "makeSocket", Mock(return_value=client))
+    monkeypatch.setattr(logging.root, "handlers", [])
+    monkeypatch.setattr(logging.root, "level", logging.root.level)
+    logging.basicConfig(handlers=[remote.handler], level=logging.INFO)
+    remote.start()
+    logger = logging.getLogger("app_1.BogoSort")
+    logger.info("Sorting %d", 5)
+    try:
+        raise ZeroDivisionError("division by zero")
+    except ZeroDivisionError:
+        logger.exception("Failed %s", "sort")
+    remote.stop()
+    sorting, failed = read_frames(server, 2)
+    assert (sorting["msg"], sorting["args"], sorting["exc_text"]) == ("Sorting 5", None, None)
+    assert failed["msg"] == "Failed sort"
+    assert failed["exc_text"].startswith("Traceback (most recent call last):")
+    assert failed["exc_text"].endswith("ZeroDivisionError: division by zero")
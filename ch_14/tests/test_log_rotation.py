@@ -0,0 +1,100 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+"""
+import gzip
+import json
+from pathlib import Path
+import pytest
+from log_rotation import RotatingLog, segments
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def manifest(tmp_path: Path) -> list[dict]:
+    return json.loads((tmp_path / "one.manifest.json").read_text())
+
+
+def test_size_rotation(tmp_path, clock):
+    with RotatingLog(tmp_path / "one.log", max_bytes=20, max_seconds=None, clock=clock) as log:
+        for n in range(5):
+            clock.now += 1
+            log.write(f"line {n:04d}\n")
+    assert [s["segment"] for s in manifest(tmp_path)] == [
+        "one.000001.log", "one.000002.log", "one.000003.log"
+    ]
+    assert [(s["first"], s["last"], s["lines"]) for s in manifest(tmp_path)] == [
+        (1001.0, 1002.0, 2), (1003.0, 1004.0, 2), (1005.0, 1005.0, 1)
+    ]
+    assert (tmp_path / "one.000002.log").read_text() == "line 0002\nline 0003\n"
+    assert not (tmp_path / "one.log").exists()
+
+
+def test_time_rotation(tmp_path, clock):
+    with RotatingLog(tmp_path / "one.log", max_bytes=None, max_seconds=60, clock=clock) as log:
+        for n in range(4):
+            log.write(f"line {n}\n")
+            clock.now += 30
+    assert [s["lines"] for s in manifest(tmp_path)] == [2, 2]
+
+
+def test_compress_and_keep(tmp_path, clock):
+    with RotatingLog(
+        tmp_path / "one.log", max_bytes=10, max_seconds=None, compress=True, keep=2, clock=clock
+    ) as log:
+        for n in range(4):
+            log.write(f"line {n:04d}\n")
+    assert [s["segment"] for s in manifest(tmp_path)] == [
+        "one.000003.log.gz", "one.000004.log.gz"
+    ]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "one.000003.log.gz", "one.000004.log.gz", "one.manifest.json"
+    ]
+    with gzip.open(tmp_path / "one.000004.log.gz", "rt") as segment:
+        assert segment.read() == "line 0003\n"
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_keep_none(tmp_path, clock, compress):
+    with RotatingLog(
+        tmp_path / "one.log", max_bytes=10, max_seconds=None, compress=compress, keep=0, clock=clock
+    ) as log:
+        for n in range(3):
+            log.write(f"line {n:04d}\n")
+    assert manifest(tmp_path) == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["one.manifest.json"]
+    with pytest.raises(ValueError):
+        RotatingLog(tmp_path / "two.log", keep=-1)
+
+
+def test_restart(tmp_path, clock):
+    (tmp_path / "one.log").write_text("left over\n")
+    with RotatingLog(tmp_path / "one.log", max_bytes=100, clock=clock) as log:
+        log.write("new\n")
+    first, second = manifest(tmp_path)
+    assert (first["segment"], first["first"], first["lines"]) == ("one.000001.log", None, None)
+    assert (second["segment"], second["first"]) == ("one.000002.log", 1000.0)
+    with RotatingLog(tmp_path / "one.log", max_bytes=100, clock=clock) as log:
+        log.write("again\n")
+    assert manifest(tmp_path)[-1]["segment"] == "one.000003.log"
+
+
+def test_segments(tmp_path, clock):
+    with RotatingLog(tmp_path / "one.log", max_bytes=8, max_seconds=None, clock=clock) as log:
+        for n in range(5):
+            clock.now = 1000.0 + 10 * n
+            log.write(f"line {n}\n")
+    found = segments(tmp_path / "one.manifest.json", 1015.0, 1025.0)
+    assert [p.name for p in found] == ["one.000003.log"]
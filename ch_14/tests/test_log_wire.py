@@ -0,0 +1,69 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+"""
+import json
+import logging
+import logging.handlers
+import pickle
+import struct
+import sys
+import pytest
+import log_wire
+
+
+@pytest.fixture
+def record():
+    record = logging.LogRecord(
+        "app.Sorter", logging.INFO, "/app/sorter.py", 42, 'sorted "%s" é', ("x",), None, "sort"
+    )
+    return record
+
+
+@pytest.fixture
+def exc_record():
+    try:
+        raise ZeroDivisionError("division by zero")
+    except ZeroDivisionError:
+        return logging.LogRecord(
+            "app", logging.ERROR, "/app/main.py", 7, "failed", None, sys.exc_info(), "main"
+        )
+
+
+def test_round_trip(record):
+    payload = log_wire.encode(record)
+    assert log_wire.is_wire(payload)
+    assert log_wire.check(payload)
+    fields = log_wire.decode(payload)
+    assert fields["msg"] == 'sorted "x" é'
+    assert fields["args"] is None
+    assert fields["exc_text"] is None
+    assert (fields["name"], fields["levelno"], fields["lineno"]) == ("app.Sorter", 20, 42)
+    assert (fields["created"], fields["process"]) == (record.created, record.process)
+
+
+def test_same_json_as_pickle(exc_record):
+    """The wire format produces the same line as the pickle path."""
+    pickled = logging.handlers.SocketHandler("localhost", 0).makePickle(exc_record)
+    wire = log_wire.WireSocketHandler("localhost", 0).makePickle(exc_record)
+    assert struct.unpack(">L", wire[:4])[0] == len(wire) - 4
+    expected = json.dumps(pickle.loads(pickled[4:])) + "\n"
+    assert log_wire.to_json(wire[4:]) == expected
+    assert "ZeroDivisionError" in json.loads(expected)["exc_text"]
+
+
+def test_optional_fields(record):
+    record.process = record.thread = None
+    fields = log_wire.decode(log_wire.encode(record))
+    assert fields["process"] is None and fields["thread"] is None
+
+
+@pytest.mark.parametrize(
+    "mangle", [lambda p: p[:-1], lambda p: p + b"x", lambda p: p[:10], lambda p: b"\x00XXX" + p[4:]]
+)
+def test_malformed(record, mangle):
+    payload = mangle(log_wire.encode(record))
+    assert not log_wire.check(payload)
+    with pytest.raises(log_wire.WireError):
+        log_wire.decode(payload)
@@ -0,0 +1,56 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+"""
+from math import prod
+import random
+import pytest
+import prime_factor
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return prime_factor.FactorEngine(1_000_000_000)
+
+
+def test_same_as_trial_division(engine):
+    random.seed(42)
+    values = list(range(200)) + [random.randint(100_000_000, 1_000_000_000) for _ in range(500)]
+    for value in values:
+        assert engine.factors(value) == prime_factor.prime_factors(value), value
+
+
+@pytest.mark.parametrize(
+    "value",
+    [1_000_003**2, 10_007**3 * 2, 999_983 * 1_000_003 * 1_000_033, 2**61 - 1, 3_215_031_751],
+)
+def test_large(value):
+    engine = prime_factor.FactorEngine(value)
+    factors = engine.factors(value)
+    assert prod(factors) == value
+    assert factors == sorted(factors)
+    assert all(prime_factor.is_prime(f) for f in factors)
+
+
+def test_pool_worker():
+    prime_factor.init_worker(1_000)
+    assert prime_factor.fast_prime_factors(360) == [2, 2, 2, 3, 3, 5]
+
+
+def test_factor_batch():
+    random.seed(42)
+    values = [random.randint(100_000_000, 1_000_000_000) for _ in range(200)]
+    results, report = prime_factor.factor_batch(values, workers=2, chunksize=16)
+    assert results == [prime_factor.prime_factors(v) for v in values]
+    assert report.chunksize == 16
+    assert report.values == 200
+    assert sum(w.values for w in report.workers) == 200
+    assert report.rate > 0
+
+
+def test_choose_chunksize(engine):
+    values = list(range(100_000_000, 100_010_000))
+    chunksize = prime_factor.choose_chunksize(values, 4, engine)
+    assert 1 <= chunksize <= len(values) // 16
+    assert prime_factor.choose_chunksize([12], 4, engine) == 1
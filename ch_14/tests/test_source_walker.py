@@ -0,0 +1,46 @@
+"""
+Python 3 Object-Oriented Programming
+
+Chapter 14.  Concurrency
+"""
+import pytest
+import source_walker
+
+
+@pytest.fixture
+def mock_directory(tmp_path):
+    (tmp_path / "top.py").write_text("# top.py\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    for name in ("pkg", "pkg/sub", ".venv", "__pycache__", "data"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "pkg" / "mod.py").write_text("# mod.py\n")
+    (tmp_path / "pkg" / "sub" / "deep.py").write_text("# deep.py\n")
+    (tmp_path / "pkg" / "sub" / "deep.pyi").write_text("# deep.pyi\n")
+    (tmp_path / ".venv" / "lib.py").write_text("# lib.py\n")
+    (tmp_path / "__pycache__" / "top.py").write_text("# cached\n")
+    (tmp_path / "data" / "table.csv").write_text("a,b\n")
+    return tmp_path
+
+
+def test_walk(mock_directory):
+    walker = source_walker.SourceWalker(["*.py"])
+    found = list(walker.walk(mock_directory))
+    assert found[0] == mock_directory / "top.py"
+    assert sorted(p.relative_to(mock_directory).as_posix() for p in found) == [
+        "pkg/mod.py", "pkg/sub/deep.py", "top.py"
+    ]
+    assert walker.files == 3
+    assert walker.seconds > 0
+    assert walker.rate > 0
+
+
+def test_patterns_and_skip(mock_directory):
+    walker = source_walker.SourceWalker(["*.pyi", "*.csv"], skip={"sub"})
+    found = {p.relative_to(mock_directory).as_posix() for p in walker.walk(mock_directory)}
+    assert found == {"data/table.csv"}
+
+
+def test_sized(mock_directory):
+    walker = source_walker.SourceWalker(["*.py"])
+    sizes = {p.name: size for p, size in walker.sized(mock_directory)}
+    assert sizes == {"top.py": 9, "mod.py": 9, "deep.py": 10}